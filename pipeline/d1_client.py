@@ -1,42 +1,186 @@
 """D1 HTTP API client for Cloudflare D1."""
 
-from typing import Dict, List, Optional
-import requests
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import orjson
+import urllib3
+from urllib3.exceptions import HTTPError
+
+
+# Stay well below D1's 100KB statement / request size limits
+MAX_BATCH_STATEMENTS = 100
+MAX_BATCH_BYTES = 90_000
+# D1 caps bound parameters per statement
+MAX_BOUND_PARAMS = 100
+# Independent requests in flight at once (requests are I/O-bound, so threads suffice)
+MAX_CONCURRENT_REQUESTS = 8
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_ATTEMPTS = 5
+
+FIGURE_UPSERT_SQL = (
+    "INSERT INTO figures (id, paper_id, kind, r2_key, thumb_key, width, height) VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT(id) DO UPDATE SET r2_key=excluded.r2_key, thumb_key=excluded.thumb_key, width=excluded.width, height=excluded.height"
+)
+
+
+class D1QueryError(Exception):
+    """D1 rejected a request (HTTP 4xx or an SQL error); sending it again unchanged fails the same way."""
+
+
+def create_pool(headers: Optional[Dict] = None) -> urllib3.PoolManager:
+    """Create a keep-alive connection pool so repeated D1 calls reuse one TCP+TLS connection"""
+    return urllib3.PoolManager(num_pools=4, maxsize=16, headers=headers, retries=False, timeout=urllib3.Timeout(total=30))
+
+
+def _retry_after(response: urllib3.HTTPResponse) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, if it holds a number"""
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+def post_with_retry(http: urllib3.PoolManager, url: str, body: Dict, headers: Optional[Dict] = None) -> urllib3.HTTPResponse:
+    """POST a JSON body, retrying connection errors and transient HTTP statuses with exponential backoff and jitter.
+
+    Responses with other error statuses are returned as-is so callers can read D1's error payload.
+    """
+    payload = orjson.dumps(body)
+    for attempt in range(MAX_ATTEMPTS):
+        last_attempt = attempt == MAX_ATTEMPTS - 1
+        delay = None
+        try:
+            response = http.request("POST", url, body=payload, headers=headers)
+            if response.status not in RETRY_STATUSES or last_attempt:
+                return response
+            delay = _retry_after(response)
+        except HTTPError:
+            if last_attempt:
+                raise
+        time.sleep(delay if delay is not None else min(2 ** attempt, 16) + random.random())
 
 
 class D1Client:
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, max_concurrency: int = MAX_CONCURRENT_REQUESTS):
         self.url = f"https://api.cloudflare.com/client/v4/accounts/{config['account_id']}/d1/database/{config['database_id']}/query"
         self.headers = {"Authorization": f"Bearer {config['api_token']}", "Content-Type": "application/json"}
-    
-    def _execute(self, sql: str) -> List[Dict]:
-        """Execute SQL and return results"""
+        self.http = create_pool(self.headers)
+        self.max_concurrency = max_concurrency
+
+    def _post(self, body: Dict) -> List[Dict]:
+        """POST a request body to the query endpoint and return the raw per-statement results"""
         try:
-            response = requests.post(self.url, headers=self.headers, json={"sql": sql}, timeout=30)
-            response.raise_for_status()
-            result = response.json()
-            
-            if not result.get('success'):
-                raise Exception(f"D1 error: {result.get('errors', [])}")
-            
-            return result.get('result', [{}])[0].get('results', [])
-        except requests.exceptions.RequestException as e:
+            response = post_with_retry(self.http, self.url, body)
+        except HTTPError as e:
             raise Exception(f"D1 API failed: {e}")
-    
-    def query(self, sql: str) -> List[Dict]:
+
+        try:
+            result = orjson.loads(response.data)
+        except orjson.JSONDecodeError:
+            raise Exception(f"D1 API failed: HTTP {response.status}: {response.data[:200]!r}")
+
+        # Transient statuses were already retried by post_with_retry
+        if response.status in RETRY_STATUSES:
+            raise Exception(f"D1 API failed (HTTP {response.status}): {result.get('errors', [])}")
+        if response.status >= 400 or not result.get('success'):
+            raise D1QueryError(f"D1 error (HTTP {response.status}): {result.get('errors', [])}")
+
+        return result.get('result', [{}])
+
+    def _execute(self, sql: str, params: Optional[List] = None) -> List[Dict]:
+        """Execute SQL with optional bound parameters and return results"""
+        body = {"sql": sql, "params": params} if params else {"sql": sql}
+        return self._post(body)[0].get('results', [])
+
+    def _execute_batch(self, statements: List[Dict], concurrent: bool = False) -> List[List[Dict]]:
+        """Execute prepared statements ({'sql': ..., 'params': [...]}) in as few requests as possible.
+
+        Statements are chunked by count and serialized size. Chunks are sent one after
+        another so writes apply in order; only read-only batches (concurrent=True) send
+        chunks in parallel. If D1 rejects a chunk (D1QueryError), its statements are
+        re-issued one by one so the failing statement can be identified; transient
+        failures (already retried by post_with_retry) are raised unchanged.
+        """
+        chunks = list(self._chunk_statements(statements))
+        chunk_results = self._map(self._execute_chunk, chunks) if concurrent else [self._execute_chunk(c) for c in chunks]
+        return [results for chunk in chunk_results for results in chunk]
+
+    def _execute_chunk(self, chunk: List[Dict]) -> List[List[Dict]]:
+        try:
+            return [r.get('results', []) for r in self._post({"batch": chunk})]
+        except D1QueryError as batch_error:
+            if len(chunk) == 1:
+                raise
+            results = []
+            for statement in chunk:
+                try:
+                    results.append(self._post(statement)[0].get('results', []))
+                except D1QueryError as e:
+                    raise D1QueryError(f"{e} (statement: {statement['sql'][:80]}..., params: {statement.get('params')})") from batch_error
+            return results
+
+    def _map(self, fn: Callable, items: List) -> List:
+        """Apply fn to items concurrently over the shared session, preserving order"""
+        if len(items) <= 1 or self.max_concurrency <= 1:
+            return [fn(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as executor:
+            return list(executor.map(fn, items))
+
+    @staticmethod
+    def _chunk_statements(statements: List[Dict]) -> Iterable[List[Dict]]:
+        """Split statements into chunks bounded by MAX_BATCH_STATEMENTS and MAX_BATCH_BYTES"""
+        chunk, chunk_bytes = [], 0
+        for statement in statements:
+            size = len(orjson.dumps(statement))
+            if chunk and (len(chunk) >= MAX_BATCH_STATEMENTS or chunk_bytes + size > MAX_BATCH_BYTES):
+                yield chunk
+                chunk, chunk_bytes = [], 0
+            chunk.append(statement)
+            chunk_bytes += size
+        if chunk:
+            yield chunk
+
+    def query(self, sql: str, params: Optional[List] = None) -> List[Dict]:
         """Execute query against D1"""
-        return self._execute(sql)
-    
+        return self._execute(sql, params)
+
+    def execute_many(self, sql: str, param_rows: Iterable[List]) -> List[List[Dict]]:
+        """Execute one prepared statement once per parameter row, batched into as few requests as possible (in order)"""
+        return self._execute_batch([{"sql": sql, "params": list(params)} for params in param_rows])
+
+    def execute_batch(self, statements: List[Tuple[str, List]]) -> List[List[Dict]]:
+        """Execute (sql, params) write statements batched into as few requests as possible, in input order"""
+        return self._execute_batch([{"sql": sql, "params": params} for sql, params in statements])
+
+    def query_batch(self, statements: List[Tuple[str, List]]) -> List[List[Dict]]:
+        """Execute read-only (sql, params) queries batched into concurrent requests, returning results in input order"""
+        return self._execute_batch([{"sql": sql, "params": params} for sql, params in statements], concurrent=True)
+
     def get_papers_needing_figures(self, category: str, limit: Optional[int] = None) -> List[str]:
         """Get paper IDs without figures for a category"""
         table = f'papers_{category.lower().replace(".", "_")}'
-        limit_sql = f"LIMIT {limit}" if limit else ""
-        sql = f"SELECT p.id FROM {table} p LEFT JOIN figures f ON p.id = f.paper_id WHERE f.id IS NULL ORDER BY p.submitted_date DESC {limit_sql}"
+        sql = f"SELECT p.id FROM {table} p LEFT JOIN figures f ON p.id = f.paper_id WHERE f.id IS NULL ORDER BY p.submitted_date DESC"
+        if limit:
+            return [row['id'] for row in self.query(f"{sql} LIMIT ?", [limit])]
         return [row['id'] for row in self.query(sql)]
-    
+
     def insert_figure(self, paper_id: str, kind: str, r2_key: str, thumb_key: str, width: int, height: int):
         """Insert or update figure metadata in D1"""
-        figure_id = f"{paper_id}-{kind}"
-        thumb = f"'{thumb_key}'" if thumb_key else "NULL"
-        sql = f"INSERT INTO figures (id, paper_id, kind, r2_key, thumb_key, width, height) VALUES ('{figure_id}', '{paper_id}', '{kind}', '{r2_key}', {thumb}, {width}, {height}) ON CONFLICT(id) DO UPDATE SET r2_key=excluded.r2_key, thumb_key=excluded.thumb_key, width=excluded.width, height=excluded.height"
-        self._execute(sql)
+        self._execute(FIGURE_UPSERT_SQL, [f"{paper_id}-{kind}", paper_id, kind, r2_key, thumb_key, width, height])
+
+    def insert_figures_batch(self, rows: Iterable[Tuple[str, str, str, Optional[str], int, int]]) -> int:
+        """Insert or update many figures in as few requests as possible. Returns the number of figures written.
+
+        Rows are (paper_id, kind, r2_key, thumb_key, width, height). Nothing is buffered
+        here: callers collect rows and keep them until this returns, so a failed write
+        (which raises) can be retried.
+        """
+        rows = list(rows)
+        self.execute_many(FIGURE_UPSERT_SQL, (
+            [f"{paper_id}-{kind}", paper_id, kind, r2_key, thumb_key, width, height]
+            for paper_id, kind, r2_key, thumb_key, width, height in rows
+        ))
+        return len(rows)
@@ -20,8 +20,79 @@ def get_category_mapping():
     }
 
 
+def _category_schema(table: str) -> str:
+    """Migration 0002: category paper table."""
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+          id TEXT PRIMARY KEY,
+          title TEXT NOT NULL,
+          authors TEXT NOT NULL,
+          categories TEXT NOT NULL,
+          primary_category TEXT,
+          abstract TEXT,
+          submitted_date TEXT NOT NULL,
+          announce_date TEXT,
+          scraped_date TEXT NOT NULL,
+          pdf_url TEXT,
+          code_url TEXT,
+          project_url TEXT,
+          comments TEXT,
+          created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+
+
+def _index_schema(table: str) -> str:
+    return f"CREATE INDEX IF NOT EXISTS idx_{table}_submitted ON {table}(submitted_date DESC);"
+
+
+def _fts_schema(table: str) -> str:
+    return f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+          title,
+          abstract,
+          authors,
+          content={table},
+          content_rowid=rowid,
+          tokenize='porter unicode61'
+        );
+    """
+
+
+def _triggers(table: str) -> list:
+    """FTS sync triggers as separate statements, so they can run inside one transaction."""
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_ai",
+        f"""CREATE TRIGGER {table}_ai AFTER INSERT ON {table} BEGIN
+          INSERT INTO {table}_fts(rowid, title, abstract, authors)
+          VALUES (new.rowid, new.title, new.abstract, new.authors);
+        END""",
+        f"DROP TRIGGER IF EXISTS {table}_ad",
+        f"""CREATE TRIGGER {table}_ad AFTER DELETE ON {table} BEGIN
+          DELETE FROM {table}_fts WHERE rowid = old.rowid;
+        END""",
+        f"DROP TRIGGER IF EXISTS {table}_au",
+        f"""CREATE TRIGGER {table}_au AFTER UPDATE ON {table} BEGIN
+          UPDATE {table}_fts
+          SET title = new.title, abstract = new.abstract, authors = new.authors
+          WHERE rowid = new.rowid;
+        END""",
+    ]
+
+
+def _category_tables() -> list:
+    return [table_name for _, table_name in get_category_mapping().values()]
+
+
 def create_production_schema(conn: sqlite3.Connection):
     """Create the full production schema including FTS5 tables and triggers."""
+    create_base_schema(conn)
+    create_secondary_indexes(conn)
+    create_fts_and_triggers(conn)
+
+
+def create_base_schema(conn: sqlite3.Connection):
+    """Create the content tables without secondary indexes or FTS, ready for bulk loading."""
     cursor = conn.cursor()
     
     cursor.executescript("""
@@ -36,8 +107,6 @@ def create_production_schema(conn: sqlite3.Connection):
           height INTEGER
         );
         
-        CREATE INDEX IF NOT EXISTS idx_figures_paper ON figures(paper_id);
-        
         CREATE TABLE IF NOT EXISTS access_keys (
           id TEXT PRIMARY KEY,
           key_hash TEXT UNIQUE NOT NULL,
@@ -56,230 +125,273 @@ def create_production_schema(conn: sqlite3.Connection):
         CREATE INDEX IF NOT EXISTS idx_access_keys_hash ON access_keys(key_hash);
         CREATE INDEX IF NOT EXISTS idx_access_keys_expires ON access_keys(expires_at);
         
-        -- Migration 0002: Category Tables
-        CREATE TABLE IF NOT EXISTS papers_cs_cv (
-          id TEXT PRIMARY KEY,
-          title TEXT NOT NULL,
-          authors TEXT NOT NULL,
-          categories TEXT NOT NULL,
-          primary_category TEXT,
-          abstract TEXT,
-          submitted_date TEXT NOT NULL,
-          announce_date TEXT,
-          scraped_date TEXT NOT NULL,
-          pdf_url TEXT,
-          code_url TEXT,
-          project_url TEXT,
-          comments TEXT,
-          created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        -- Local only: fingerprints of the filtered databases each table was built from
+        CREATE TABLE IF NOT EXISTS build_meta (
+          category TEXT PRIMARY KEY,
+          source_hash TEXT,
+          row_count INTEGER
         );
-        
-        CREATE INDEX IF NOT EXISTS idx_papers_cs_cv_submitted ON papers_cs_cv(submitted_date DESC);
-        
-        CREATE TABLE IF NOT EXISTS papers_cs_hc (
-          id TEXT PRIMARY KEY,
-          title TEXT NOT NULL,
-          authors TEXT NOT NULL,
-          categories TEXT NOT NULL,
-          primary_category TEXT,
-          abstract TEXT,
-          submitted_date TEXT NOT NULL,
-          announce_date TEXT,
-          scraped_date TEXT NOT NULL,
-          pdf_url TEXT,
-          code_url TEXT,
-          project_url TEXT,
-          comments TEXT,
-          created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE INDEX IF NOT EXISTS idx_papers_cs_hc_submitted ON papers_cs_hc(submitted_date DESC);
-        
-        CREATE TABLE IF NOT EXISTS papers_cs_gr (
-          id TEXT PRIMARY KEY,
-          title TEXT NOT NULL,
-          authors TEXT NOT NULL,
-          categories TEXT NOT NULL,
-          primary_category TEXT,
-          abstract TEXT,
-          submitted_date TEXT NOT NULL,
-          announce_date TEXT,
-          scraped_date TEXT NOT NULL,
-          pdf_url TEXT,
-          code_url TEXT,
-          project_url TEXT,
-          comments TEXT,
-          created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE INDEX IF NOT EXISTS idx_papers_cs_gr_submitted ON papers_cs_gr(submitted_date DESC);
     """)
+    cursor.executescript("\n".join(_category_schema(t) for t in _category_tables()))
     
-    cursor.executescript("""
-        -- FTS5 Tables
-        CREATE VIRTUAL TABLE IF NOT EXISTS papers_cs_cv_fts USING fts5(
-          title, 
-          abstract, 
-          authors, 
-          content=papers_cs_cv, 
-          content_rowid=rowid,
-          tokenize='porter unicode61'
-        );
-        
-        CREATE VIRTUAL TABLE IF NOT EXISTS papers_cs_hc_fts USING fts5(
-          title, 
-          abstract, 
-          authors,
-          content=papers_cs_hc,
-          content_rowid=rowid,
-          tokenize='porter unicode61'
-        );
-        
-        CREATE VIRTUAL TABLE IF NOT EXISTS papers_cs_gr_fts USING fts5(
-          title, 
-          abstract, 
-          authors, 
-          content=papers_cs_gr, 
-          content_rowid=rowid,
-          tokenize='porter unicode61'
-        );
+    conn.commit()
+
+
+def create_secondary_indexes(conn: sqlite3.Connection):
+    """Create the lookup indexes; done after bulk loading so each B-tree is built in one pass."""
+    conn.executescript("\n".join(
+        ["CREATE INDEX IF NOT EXISTS idx_figures_paper ON figures(paper_id);"]
+        + [_index_schema(t) for t in _category_tables()]
+    ))
+
+
+def create_fts_and_triggers(conn: sqlite3.Connection, rebuild_tables: list = None, build_meta: list = ()):
+    """Create FTS5 tables, index any rows already loaded, then install the sync triggers.
+    
+    Building the index in one 'rebuild' pass after bulk loading is much cheaper than
+    letting the insert triggers update it row by row. rebuild_tables limits the
+    rebuild to the given tables (default: all category tables).
+    
+    build_meta rows (category, source_hash, row_count) are recorded in the same
+    transaction, so a category only counts as built once its FTS index and triggers
+    are in place; after a crash the next incremental run rebuilds it.
+    """
+    tables = _category_tables()
+    
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for table_name in tables:
+            conn.execute(_fts_schema(table_name))
+        for table_name in tables if rebuild_tables is None else rebuild_tables:
+            conn.execute(f"INSERT INTO {table_name}_fts({table_name}_fts) VALUES('rebuild')")
+        for table_name in tables:
+            for statement in _triggers(table_name):
+                conn.execute(statement)
+        conn.executemany(
+            "INSERT OR REPLACE INTO build_meta (category, source_hash, row_count) VALUES (?, ?, ?)",
+            build_meta
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+PAPER_COLUMNS = (
+    'id', 'title', 'authors', 'categories', 'primary_category',
+    'abstract', 'submitted_date', 'announce_date', 'scraped_date',
+    'pdf_url', 'code_url', 'project_url', 'comments', 'created_at'
+)
+
+
+def upsert_clause(target_table: str) -> str:
+    """ON CONFLICT clause that only rewrites a paper (and fires its FTS trigger) when a column changed."""
+    updated = PAPER_COLUMNS[1:]
+    assignments = ', '.join(f"{c}=excluded.{c}" for c in updated)
+    changed = ' OR '.join(f"{target_table}.{c} IS NOT excluded.{c}" for c in updated)
+    return f"ON CONFLICT(id) DO UPDATE SET {assignments} WHERE {changed}"
+
+
+def configure_bulk_load(conn: sqlite3.Connection):
+    """Tune a new, empty database for bulk loading (it is disposable, so durability can be relaxed).
+    
+    page_size only takes effect before the first table is created and before WAL is enabled.
+    """
+    conn.executescript("""
+        PRAGMA page_size=32768;
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=OFF;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA mmap_size=268435456;
+        PRAGMA cache_size=-524288;
     """)
+
+
+def finish_bulk_load(conn: sqlite3.Connection):
+    """Restore normal durability and fold the WAL back so the database is a single self-contained file."""
+    conn.executescript("""
+        PRAGMA synchronous=NORMAL;
+        PRAGMA journal_mode=DELETE;
+    """)
+
+
+def transfer_papers(source_db: Path, target_conn: sqlite3.Connection, target_table: str, category: str,
+                    batch_size: int = 10000, show_progress: bool = False):
+    """Transfer papers from source database to target table.
     
-    cursor.executescript("""
-        -- Triggers for papers_cs_cv
-        DROP TRIGGER IF EXISTS papers_cs_cv_ai;
-        CREATE TRIGGER papers_cs_cv_ai AFTER INSERT ON papers_cs_cv BEGIN
-          INSERT INTO papers_cs_cv_fts(rowid, title, abstract, authors)
-          VALUES (new.rowid, new.title, new.abstract, new.authors);
-        END;
-        
-        DROP TRIGGER IF EXISTS papers_cs_cv_ad;
-        CREATE TRIGGER papers_cs_cv_ad AFTER DELETE ON papers_cs_cv BEGIN
-          DELETE FROM papers_cs_cv_fts WHERE rowid = old.rowid;
-        END;
-        
-        DROP TRIGGER IF EXISTS papers_cs_cv_au;
-        CREATE TRIGGER papers_cs_cv_au AFTER UPDATE ON papers_cs_cv BEGIN
-          UPDATE papers_cs_cv_fts 
-          SET title = new.title, abstract = new.abstract, authors = new.authors
-          WHERE rowid = new.rowid;
-        END;
-        
-        -- Triggers for papers_cs_hc
-        DROP TRIGGER IF EXISTS papers_cs_hc_ai;
-        CREATE TRIGGER papers_cs_hc_ai AFTER INSERT ON papers_cs_hc BEGIN
-          INSERT INTO papers_cs_hc_fts(rowid, title, abstract, authors)
-          VALUES (new.rowid, new.title, new.abstract, new.authors);
-        END;
-        
-        DROP TRIGGER IF EXISTS papers_cs_hc_ad;
-        CREATE TRIGGER papers_cs_hc_ad AFTER DELETE ON papers_cs_hc BEGIN
-          DELETE FROM papers_cs_hc_fts WHERE rowid = old.rowid;
-        END;
-        
-        DROP TRIGGER IF EXISTS papers_cs_hc_au;
-        CREATE TRIGGER papers_cs_hc_au AFTER UPDATE ON papers_cs_hc BEGIN
-          UPDATE papers_cs_hc_fts 
-          SET title = new.title, abstract = new.abstract, authors = new.authors
-          WHERE rowid = new.rowid;
-        END;
-        
-        -- Triggers for papers_cs_gr
-        DROP TRIGGER IF EXISTS papers_cs_gr_ai;
-        CREATE TRIGGER papers_cs_gr_ai AFTER INSERT ON papers_cs_gr BEGIN
-          INSERT INTO papers_cs_gr_fts(rowid, title, abstract, authors)
-          VALUES (new.rowid, new.title, new.abstract, new.authors);
-        END;
-        
-        DROP TRIGGER IF EXISTS papers_cs_gr_ad;
-        CREATE TRIGGER papers_cs_gr_ad AFTER DELETE ON papers_cs_gr BEGIN
-          DELETE FROM papers_cs_gr_fts WHERE rowid = old.rowid;
-        END;
+    By default the copy runs entirely inside SQLite (ATTACH + INSERT ... SELECT).
+    With show_progress, papers are copied through Python in batches to report progress.
+    Either way, papers the source no longer has are deleted from the target in the
+    same transaction.
+    """
+    if show_progress:
+        return _transfer_papers_batched(source_db, target_conn, target_table, batch_size)
+    
+    columns = ', '.join(PAPER_COLUMNS)
+    target_conn.execute("ATTACH DATABASE ? AS src", (str(source_db),))
+    try:
+        total_papers = target_conn.execute("SELECT COUNT(*) FROM src.papers").fetchone()[0]
+        print(f"  Transferring {total_papers:,} papers to {target_table}...", file=sys.stderr)
         
-        DROP TRIGGER IF EXISTS papers_cs_gr_au;
-        CREATE TRIGGER papers_cs_gr_au AFTER UPDATE ON papers_cs_gr BEGIN
-          UPDATE papers_cs_gr_fts 
-          SET title = new.title, abstract = new.abstract, authors = new.authors
-          WHERE rowid = new.rowid;
-        END;
-    """)
+        target_conn.execute("BEGIN IMMEDIATE")
+        try:
+            _delete_missing(target_conn, target_table)
+            cursor = target_conn.execute(
+                f"INSERT INTO {target_table} ({columns}) SELECT {columns} FROM src.papers WHERE true "
+                f"{upsert_clause(target_table)}"
+            )
+            transferred = cursor.rowcount
+            target_conn.commit()
+        except BaseException:
+            target_conn.rollback()
+            raise
+    finally:
+        target_conn.execute("DETACH DATABASE src")
     
-    conn.commit()
+    return transferred
+
+
+def source_fingerprint(source_db: Path) -> str:
+    """Cheap change detector for a filtered database: size and modification time."""
+    stat = source_db.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _delete_missing(conn: sqlite3.Connection, target_table: str) -> int:
+    """Delete papers the attached source database ('src') no longer has. Returns the number deleted."""
+    removed = conn.execute(f"DELETE FROM {target_table} WHERE id NOT IN (SELECT id FROM src.papers)").rowcount
+    if removed:
+        print(f"  Removed {removed:,} papers no longer in the source", file=sys.stderr)
+    return removed
 
 
-def transfer_papers(source_db: Path, target_conn: sqlite3.Connection, target_table: str, category: str, batch_size: int = 10000):
-    """Transfer papers from source database to target table."""
+def _drop_triggers(conn: sqlite3.Connection, table: str):
+    conn.executescript("".join(f"DROP TRIGGER IF EXISTS {table}_{suffix};" for suffix in ("ai", "ad", "au")))
+
+
+def _transfer_papers_batched(source_db: Path, target_conn: sqlite3.Connection, target_table: str, batch_size: int):
+    """Transfer papers through Python in batches, updating a progress line as batches complete."""
     source_conn = sqlite3.connect(str(source_db))
-    source_conn.row_factory = sqlite3.Row
     source_cursor = source_conn.cursor()
     
     target_cursor = target_conn.cursor()
     
-    source_cursor.execute("SELECT COUNT(*) as count FROM papers")
-    total_papers = source_cursor.fetchone()['count']
+    source_cursor.execute("SELECT COUNT(*) FROM papers")
+    total_papers = source_cursor.fetchone()[0]
     
     print(f"  Transferring {total_papers:,} papers to {target_table}...", file=sys.stderr)
     
-    offset = 0
+    insert_sql = f"""
+        INSERT INTO {target_table} ({', '.join(PAPER_COLUMNS)})
+        VALUES ({', '.join('?' * len(PAPER_COLUMNS))})
+        {upsert_clause(target_table)}
+    """
+    
     transferred = 0
+    failures = []
+    total_batches = max(1, -(-total_papers // batch_size))
+    # Redraw the progress line at most ~100 times per table
+    report_every = max(1, total_batches // 100)
     
-    while True:
-        source_cursor.execute("SELECT * FROM papers LIMIT ? OFFSET ?", (batch_size, offset))
-        batch = source_cursor.fetchall()
-        
-        if not batch:
-            break
-        
-        for paper in batch:
+    # Attached only to prune removed papers; ATTACH is not allowed inside a transaction
+    target_conn.execute("ATTACH DATABASE ? AS src", (str(source_db),))
+    target_conn.execute("BEGIN IMMEDIATE")
+    try:
+        _delete_missing(target_conn, target_table)
+        # Rows come back as plain tuples in PAPER_COLUMNS order, ready for executemany
+        source_cursor.execute(f"SELECT {', '.join(PAPER_COLUMNS)} FROM papers ORDER BY rowid")
+        batch_num = 0
+        while (rows := source_cursor.fetchmany(batch_size)):
+            batch_num += 1
             try:
-                paper_dict = dict(paper)
-                target_cursor.execute(f"""
-                    INSERT OR REPLACE INTO {target_table} (
-                        id, title, authors, categories, primary_category,
-                        abstract, submitted_date, announce_date, scraped_date,
-                        pdf_url, code_url, project_url, comments, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    paper_dict['id'],
-                    paper_dict['title'],
-                    paper_dict['authors'],
-                    paper_dict['categories'],
-                    paper_dict.get('primary_category'),
-                    paper_dict.get('abstract'),
-                    paper_dict['submitted_date'],
-                    paper_dict.get('announce_date'),
-                    paper_dict['scraped_date'],
-                    paper_dict.get('pdf_url'),
-                    paper_dict.get('code_url'),
-                    paper_dict.get('project_url'),
-                    paper_dict.get('comments'),
-                    paper_dict.get('created_at')
-                ))
-                transferred += 1
-            except Exception as e:
-                paper_id = dict(paper).get('id', 'unknown') if hasattr(paper, 'keys') else 'unknown'
-                print(f"  Warning: Failed to transfer {paper_id}: {e}", file=sys.stderr)
+                target_cursor.executemany(insert_sql, rows)
+                transferred += len(rows)
+            except sqlite3.Error:
+                # Fall back to row-by-row inserts to report the offending papers
+                for row in rows:
+                    try:
+                        target_cursor.execute(insert_sql, row)
+                        transferred += 1
+                    except sqlite3.Error as e:
+                        failures.append((row[0], e))
+            
+            if batch_num % report_every == 0 or batch_num == total_batches:
+                progress_pct = (transferred / total_papers * 100) if total_papers > 0 else 0
+                sys.stderr.write(f"\r  [{target_table}] {transferred:,}/{total_papers:,} ({progress_pct:.1f}%)")
+                sys.stderr.flush()
         
         target_conn.commit()
-        offset += batch_size
-        
-        progress_pct = (transferred / total_papers * 100) if total_papers > 0 else 0
-        print(f"  [{target_table}] {transferred:,}/{total_papers:,} ({progress_pct:.1f}%)", file=sys.stderr)
-        
-        if len(batch) < batch_size:
-            break
+    except BaseException:
+        target_conn.rollback()
+        raise
+    finally:
+        sys.stderr.write("\n")
+        source_conn.close()
+        target_conn.execute("DETACH DATABASE src")
+    
+    if failures:
+        print(f"  Warning: Failed to transfer {len(failures):,} papers", file=sys.stderr)
+        for paper_id, e in failures[:10]:
+            print(f"    {paper_id}: {e}", file=sys.stderr)
     
-    source_conn.close()
     return transferred
 
 
-def build_local_debug_db(output_path: Path = None, batch_size: int = 10000):
+FICLONE = 0x40049409  # Linux ioctl: share extents copy-on-write (Btrfs, XFS, ...)
+
+
+def clone_or_copy(source: Path, target: Path) -> str:
+    """Copy source over target, as a copy-on-write reflink when the filesystem supports it.
+    
+    The target is rewritten in place rather than replaced or hardlinked, so a running
+    wrangler keeps the same file open and the two databases never share writes.
+    Returns 'reflink' or 'copy'.
+    """
+    if sys.platform.startswith('linux'):
+        import fcntl
+        try:
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            shutil.copystat(source, target)
+            return 'reflink'
+        except OSError:
+            pass
+    shutil.copy2(source, target)
+    return 'copy'
+
+
+def snapshot_db(source: Path, target: Path) -> str:
+    """Copy source over target with SQLite's online backup API.
+    
+    The copy is a transactionally consistent snapshot even if source is being written,
+    and it goes through SQLite's locking on target, so a running wrangler sees either
+    the old or the new database. Falls back to clone_or_copy when the backup cannot
+    be applied (e.g. a WAL-mode target with a different page size).
+    Returns 'backup', 'reflink' or 'copy'.
+    """
+    src = sqlite3.connect(str(source))
+    dst = sqlite3.connect(str(target))
+    try:
+        src.backup(dst)
+        return 'backup'
+    except sqlite3.Error as e:
+        print(f"  Backup API failed ({e}), copying file instead", file=sys.stderr)
+    finally:
+        dst.close()
+        src.close()
+    return clone_or_copy(source, target)
+
+
+def build_local_debug_db(output_path: Path = None, batch_size: int = 10000, show_progress: bool = False,
+                         incremental: bool = False):
     """
     Build a local development database from filtered category databases.
     
     Args:
         output_path: Path to output dev.db file (default: project_root/dev.db)
-        batch_size: Number of papers to process at a time
+        batch_size: Number of papers to process at a time (only with show_progress)
+        show_progress: Copy papers in batches through Python and report progress
+        incremental: Keep an existing dev.db and skip categories whose filtered database is unchanged
     """
     project_root = Path(__file__).parent.parent.parent
     pipeline_dir = Path(__file__).parent.parent
@@ -292,17 +404,23 @@ def build_local_debug_db(output_path: Path = None, batch_size: int = 10000):
     print(f"Output:     {output_path}", file=sys.stderr)
     print(f"Batch size: {batch_size:,} papers", file=sys.stderr)
     
-    if output_path.exists():
+    if output_path.exists() and incremental:
+        print(f"\n  Output database exists, updating changed categories only", file=sys.stderr)
+    elif output_path.exists():
         print(f"\n  Warning: Output database exists, will be overwritten", file=sys.stderr)
         output_path.unlink()
     
     print(f"\nCreating database schema...", file=sys.stderr)
     conn = sqlite3.connect(str(output_path))
-    create_production_schema(conn)
+    configure_bulk_load(conn)
+    create_base_schema(conn)
     
     category_mapping = get_category_mapping()
     total_transferred = 0
     
+    built = dict(conn.execute("SELECT category, source_hash FROM build_meta"))
+    
+    sources = {}
     for filtered_db_name, (category, table_name) in category_mapping.items():
         filtered_db = pipeline_dir / f"{filtered_db_name}.db"
         
@@ -310,16 +428,38 @@ def build_local_debug_db(output_path: Path = None, batch_size: int = 10000):
             print(f"\n  Skipping {filtered_db_name}.db (not found)", file=sys.stderr)
             continue
         
+        if built.get(category) == source_fingerprint(filtered_db):
+            print(f"\n  Skipping {filtered_db_name}.db (unchanged)", file=sys.stderr)
+            continue
+        
+        sources[filtered_db] = (category, table_name)
+    
+    # Recorded with the FTS rebuild, once the category is fully built
+    build_meta = []
+    
+    for filtered_db, (category, table_name) in sources.items():
         print(f"\n{'='*60}", file=sys.stderr)
         print(f"Processing: {filtered_db.name}", file=sys.stderr)
         print(f"  Category: {category}", file=sys.stderr)
         print(f"  Table:    {table_name}", file=sys.stderr)
         print(f"{'='*60}", file=sys.stderr)
         
-        transferred = transfer_papers(filtered_db, conn, table_name, category, batch_size)
+        # FTS is rebuilt in one pass afterwards, so don't maintain it row by row
+        _drop_triggers(conn, table_name)
+        source_hash = source_fingerprint(filtered_db)
+        transferred = transfer_papers(filtered_db, conn, table_name, category, batch_size, show_progress)
         total_transferred += transferred
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        build_meta.append((category, source_hash, row_count))
         print(f"  ✓ Transferred {transferred:,} papers to {table_name}", file=sys.stderr)
     
+    if sources or not incremental:
+        print(f"\nBuilding indexes...", file=sys.stderr)
+        create_secondary_indexes(conn)
+        create_fts_and_triggers(conn, rebuild_tables=[table for _, table in sources.values()], build_meta=build_meta)
+        conn.execute("PRAGMA optimize")
+    finish_bulk_load(conn)
+    
     cursor = conn.cursor()
     
     stats = {}
@@ -353,8 +493,8 @@ def build_local_debug_db(output_path: Path = None, batch_size: int = 10000):
         if sqlite_files:
             wrangler_db_path = max(sqlite_files, key=lambda p: p.stat().st_mtime)
             try:
-                shutil.copy2(output_path, wrangler_db_path)
-                print(f"  ✓ Updated wrangler local database: {wrangler_db_path}", file=sys.stderr)
+                method = snapshot_db(output_path, wrangler_db_path)
+                print(f"  ✓ Updated wrangler local database ({method}): {wrangler_db_path}", file=sys.stderr)
                 wrangler_db_found = True
             except Exception as e:
                 print(f"  Warning: Could not update wrangler database: {e}", file=sys.stderr)
@@ -367,8 +507,9 @@ def build_local_debug_db(output_path: Path = None, batch_size: int = 10000):
 
 
 if __name__ == "__main__":
-    output_path = None
-    if len(sys.argv) > 1:
-        output_path = Path(sys.argv[1])
+    flags = {"--progress", "--incremental"}
+    args = [a for a in sys.argv[1:] if a not in flags]
+    output_path = Path(args[0]) if args else None
     
-    build_local_debug_db(output_path)
+    build_local_debug_db(output_path, show_progress="--progress" in sys.argv[1:],
+                         incremental="--incremental" in sys.argv[1:])
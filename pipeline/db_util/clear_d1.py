@@ -2,7 +2,11 @@
 """Clear all data from Cloudflare D1 (papers and figures)."""
 
 import sys
-import requests
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+import orjson
+from d1_client import create_pool, post_with_retry
 
 try:
     import config
@@ -25,19 +29,22 @@ def clear_d1() -> bool:
         return False
 
     print("\nDeleting all data from D1...", file=sys.stderr)
-    for name, sql in (("figures", "DELETE FROM figures"), ("papers", "DELETE FROM papers")):
-        print(f"  Deleting {name}...", file=sys.stderr)
-        try:
-            resp = requests.post(url, headers=headers, json={"sql": sql}, timeout=30)
-            resp.raise_for_status()
-            result = resp.json()
-            if not result.get("success"):
-                print(f"  ✗ Failed to delete {name}: {result.get('errors', [])}", file=sys.stderr)
-                return False
-            print(f"  ✓ {name.capitalize()} deleted", file=sys.stderr)
-        except Exception as e:
-            print(f"  ✗ Error deleting {name}: {e}", file=sys.stderr)
+    http = create_pool(headers)
+    tables = ("figures", "papers")
+    batch = [{"sql": f"DELETE FROM {name}"} for name in tables]
+    print(f"  Deleting {', '.join(tables)}...", file=sys.stderr)
+    try:
+        resp = post_with_retry(http, url, {"batch": batch})
+        result = orjson.loads(resp.data)
+        if resp.status >= 400 or not result.get("success"):
+            print(f"  ✗ Failed to delete: {result.get('errors', [])}", file=sys.stderr)
             return False
+        for name, statement_result in zip(tables, result.get("result", [])):
+            changes = statement_result.get("meta", {}).get("changes", 0)
+            print(f"  ✓ {name.capitalize()} deleted ({changes:,} rows)", file=sys.stderr)
+    except Exception as e:
+        print(f"  ✗ Error deleting data: {e}", file=sys.stderr)
+        return False
 
     print("\n✓ Database cleared successfully", file=sys.stderr)
     return True
@@ -6,34 +6,97 @@ have the specified category in their categories array.
 """
 
 import sys
-import json
 import sqlite3
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Tuple
 import tyro
 
 sys.path.append(str(Path(__file__).parent.parent))
-from database import PipelineDB
+from database import PAPER_COLUMNS, PipelineDB
 
 # TODO: make this more efficient; don't filtering all databases for all time ranges
 
 
-def main(category: str, batch_size: int = 10000) -> None:
+def category_like_pattern(category: str) -> str:
+    """LIKE pattern matching a category as a quoted element of the JSON categories array."""
+    escaped = category.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%"{escaped}"%'
+
+
+def copy_papers(target_db_obj: PipelineDB, source_db: Path, where: str = "", params: Tuple = ()) -> int:
+    """
+    Copy papers from another database file into the target with a single INSERT ... SELECT.
+    
+    Rows never leave SQLite; later copies replace earlier rows with the same ID.
+    
+    Returns:
+        Number of papers copied
+    """
+    columns = ', '.join(PAPER_COLUMNS)
+    target_db_obj.conn.execute("ATTACH DATABASE ? AS src", (str(source_db),))
+    try:
+        with target_db_obj.transaction() as conn:
+            cursor = conn.execute(
+                f"INSERT OR REPLACE INTO papers ({columns}) SELECT {columns} FROM src.papers {where}",
+                params
+            )
+            return cursor.rowcount
+    finally:
+        target_db_obj.conn.execute("DETACH DATABASE src")
+
+
+def scan_source(source_db: Path, category: str, target_db_obj: PipelineDB) -> Tuple[int, int]:
+    """
+    Copy papers of a category from one source database into the target database.
+    
+    Returns:
+        (papers in source database, papers transferred)
+    """
+    source_conn = sqlite3.connect(str(source_db))
+    db_total_papers = source_conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+    source_conn.close()
+    print(f"  Total papers in {source_db.name}: {db_total_papers:,}", file=sys.stderr)
+    
+    # LIKE cheaply narrows candidates; json_each confirms an exact element match
+    db_transferred = copy_papers(
+        target_db_obj, source_db,
+        "WHERE categories LIKE ? ESCAPE '\\' "
+        "AND EXISTS (SELECT 1 FROM json_each(categories) WHERE value = ?)",
+        (category_like_pattern(category), category)
+    )
+    return db_total_papers, db_transferred
+
+
+def _scan_source_to_file(source_db: Path, category: str, staging_db: Path) -> Tuple[int, int]:
+    """Worker process: scan one source database into its own staging database."""
+    staging_db_obj = PipelineDB(str(staging_db))
+    staging_db_obj.create_tables()
+    staging_db_obj.tune_for_bulk_writes()
+    try:
+        return scan_source(source_db, category, staging_db_obj)
+    finally:
+        staging_db_obj.close()
+
+
+def main(category: str, workers: int = 1) -> None:
     """
-    Filter papers by category from all available databases using batch processing.
+    Filter papers by category from all available databases inside SQLite.
     
     Args:
         category: Category to filter for (e.g., 'cs.CV', 'stat.ML')
-        batch_size: Number of papers to process at a time
+        workers: Number of source databases to scan in parallel processes
     """
     pipeline_dir = Path(__file__).parent.parent
     category_safe = category.replace('.', '_')
     target_db = pipeline_dir / f"filtered_{category_safe}.db"
     
-    print(f"\nFilter {category} Papers (Batch Mode)", file=sys.stderr)
+    print(f"\nFilter {category} Papers", file=sys.stderr)
     print(f"{'='*60}", file=sys.stderr)
     print(f"Category:   {category}", file=sys.stderr)
     print(f"Target:     {target_db}", file=sys.stderr)
-    print(f"Batch size: {batch_size:,} papers", file=sys.stderr)
+    print(f"Workers:    {workers}", file=sys.stderr)
     
     source_dbs = sorted(pipeline_dir.glob("*.db"))
     source_dbs = [db for db in source_dbs if not db.name.startswith('filtered_') and db.name != 'pipeline.db']
@@ -53,81 +116,50 @@ def main(category: str, batch_size: int = 10000) -> None:
     print(f"\nCreating target database...", file=sys.stderr)
     target_db_obj = PipelineDB(str(target_db))
     target_db_obj.create_tables()
+    target_db_obj.tune_for_bulk_writes()
     
     total_source_papers = 0
     total_processed = 0
     total_transferred = 0
     
-    for source_db in source_dbs:
-        print(f"\n{'='*60}", file=sys.stderr)
-        print(f"Processing: {source_db.name}", file=sys.stderr)
-        print(f"{'='*60}", file=sys.stderr)
-        
-        try:
-            source_conn = sqlite3.connect(str(source_db))
-            source_conn.row_factory = sqlite3.Row
-            source_cursor = source_conn.cursor()
-            
-            source_cursor.execute("SELECT COUNT(*) as count FROM papers")
-            db_total_papers = source_cursor.fetchone()['count']
-            total_source_papers += db_total_papers
-            print(f"  Total papers in {source_db.name}: {db_total_papers:,}", file=sys.stderr)
-            
-            offset = 0
-            db_processed = 0
-            db_transferred = 0
-            
-            while True:
-                source_cursor.execute(f"SELECT * FROM papers LIMIT ? OFFSET ?", (batch_size, offset))
-                batch = source_cursor.fetchall()
+    if workers > 1 and len(source_dbs) > 1:
+        print(f"\nScanning {len(source_dbs)} databases with {workers} workers...", file=sys.stderr)
+        with tempfile.TemporaryDirectory(dir=pipeline_dir) as staging_dir, \
+                ProcessPoolExecutor(max_workers=workers) as executor:
+            staging_dbs = [Path(staging_dir) / f"staging_{i}.db" for i in range(len(source_dbs))]
+            futures = [
+                executor.submit(_scan_source_to_file, source_db, category, staging_db)
+                for source_db, staging_db in zip(source_dbs, staging_dbs)
+            ]
+            # Merge in source order so later databases still win on duplicate IDs
+            for source_db, staging_db, future in zip(source_dbs, staging_dbs, futures):
+                try:
+                    db_total_papers, db_transferred = future.result()
+                    copy_papers(target_db_obj, staging_db)
+                except Exception as e:
+                    print(f"  Error processing {source_db.name}: {e}", file=sys.stderr)
+                    continue
                 
-                if not batch:
-                    break
-                
-                for paper in batch:
-                    db_processed += 1
-                    total_processed += 1
-                    
-                    categories = json.loads(paper['categories'])
-                    if category not in categories:
-                        continue
-                    
-                    try:
-                        paper_data = {
-                            'id': paper['id'],
-                            'title': paper['title'],
-                            'authors': json.loads(paper['authors']),
-                            'categories': categories,
-                            'primary_category': paper['primary_category'],
-                            'abstract': paper['abstract'],
-                            'submitted_date': paper['submitted_date'],
-                            'announce_date': paper['announce_date'],
-                            'scraped_date': paper['scraped_date'],
-                            'pdf_url': paper['pdf_url'],
-                            'code_url': paper['code_url'],
-                            'project_url': paper['project_url'],
-                            'comments': paper['comments']
-                        }
-                        target_db_obj.insert_paper(paper_data)
-                        db_transferred += 1
-                        total_transferred += 1
-                            
-                    except Exception as e:
-                        print(f"  Warning: Failed to transfer {paper['id']}: {e}", file=sys.stderr)
-                
-                offset += batch_size
-                progress_pct = (db_processed / db_total_papers * 100) if db_total_papers > 0 else 0
-                print(f"  [{source_db.name}] {db_processed:,}/{db_total_papers:,} ({progress_pct:.1f}%) | "
-                      f"Found: {db_transferred:,} {category} papers", file=sys.stderr)
-                
-                if len(batch) < batch_size:
-                    break
+                total_source_papers += db_total_papers
+                total_processed += db_total_papers
+                total_transferred += db_transferred
+                print(f"  Completed {source_db.name}: {db_transferred:,} {category} papers found", file=sys.stderr)
+    else:
+        for source_db in source_dbs:
+            print(f"\n{'='*60}", file=sys.stderr)
+            print(f"Processing: {source_db.name}", file=sys.stderr)
+            print(f"{'='*60}", file=sys.stderr)
             
-            print(f"  Completed {source_db.name}: {db_transferred:,} {category} papers found", file=sys.stderr)
-            source_conn.close()
+            try:
+                db_total_papers, db_transferred = scan_source(source_db, category, target_db_obj)
+            except Exception as e:
+                print(f"  Error processing {source_db.name}: {e}", file=sys.stderr)
+                continue
             
-        except Exception as e:
-            print(f"  Error processing {source_db.name}: {e}", file=sys.stderr)
+            total_source_papers += db_total_papers
+            total_processed += db_total_papers
+            total_transferred += db_transferred
+            print(f"  Completed {source_db.name}: {db_transferred:,} {category} papers found", file=sys.stderr)
     
     stats = target_db_obj.get_stats()
     
@@ -6,9 +6,10 @@ Run this after starting wrangler pages dev --local --persist
 """
 
 import sys
-import shutil
 from pathlib import Path
 
+from build_local_debug_db import snapshot_db
+
 
 def find_wrangler_dbs(project_root: Path):
     """Find all wrangler local D1 database files."""
@@ -47,7 +48,8 @@ def sync_dev_db_to_wrangler():
     for wrangler_db in wrangler_dbs:
         try:
             print(f"  Syncing to: {wrangler_db.name}", file=sys.stderr)
-            shutil.copy2(dev_db, wrangler_db)
+            method = snapshot_db(dev_db, wrangler_db)
+            print(f"    ✓ {method}", file=sys.stderr)
             synced_count += 1
         except Exception as e:
             print(f"  Warning: Failed to sync to {wrangler_db.name}: {e}", file=sys.stderr)
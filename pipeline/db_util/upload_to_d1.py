@@ -2,83 +2,106 @@
 
 import sys
 from pathlib import Path
-from typing import Optional
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 import tyro
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(PROJECT_ROOT / "pipeline"))
 
 from database import PipelineDB
-from d1_client import D1Client
+from d1_client import MAX_BOUND_PARAMS, D1Client
 import config
 
 
-def get_existing_papers_d1(d1: D1Client, category: str) -> set:
-    """Query D1 once for all existing paper IDs"""
-    table_name = f'papers_{category.lower().replace(".", "_")}'
+def d1_table_exists(d1: D1Client, table_name: str) -> bool:
+    """Check whether a category table exists in D1 yet"""
     print(f"Querying D1 {table_name}...", file=sys.stderr)
     
     try:
-        results = d1.query(f"SELECT id FROM {table_name}")
-        existing = {row['id'] for row in results}
-        print(f"  Found {len(existing):,} existing", file=sys.stderr)
-        return existing
+        d1.query(f"SELECT 1 FROM {table_name} LIMIT 1")
+        return True
     except:
         print(f"  Table may not exist yet, assuming empty", file=sys.stderr)
-        return set()
+        return False
+
+
+def get_existing_ids_d1(d1: D1Client, table_name: str, paper_ids: List[str]) -> Set[str]:
+    """Return which of the given paper IDs already exist in D1 (checked server-side in IN-list chunks)"""
+    statements = []
+    for i in range(0, len(paper_ids), MAX_BOUND_PARAMS):
+        chunk = paper_ids[i:i + MAX_BOUND_PARAMS]
+        statements.append((f"SELECT id FROM {table_name} WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+    return {row['id'] for results in d1.query_batch(statements) for row in results}
+
+
+UPLOAD_COLUMNS = (
+    'id', 'title', 'authors', 'categories', 'primary_category', 'abstract',
+    'submitted_date', 'announce_date', 'scraped_date', 'pdf_url', 'code_url', 'project_url', 'comments', 'created_at'
+)
+
+
+def upsert_sql(table_name: str) -> str:
+    """Parameterized upsert for one paper row into a category table"""
+    return (
+        f"INSERT INTO {table_name} ({', '.join(UPLOAD_COLUMNS)}) "
+        f"VALUES ({', '.join('?' * len(UPLOAD_COLUMNS))}) "
+        f"ON CONFLICT(id) DO UPDATE SET title=excluded.title, authors=excluded.authors, "
+        f"abstract=excluded.abstract, submitted_date=excluded.submitted_date, announce_date=excluded.announce_date, "
+        f"scraped_date=excluded.scraped_date, pdf_url=excluded.pdf_url, code_url=excluded.code_url, "
+        f"project_url=excluded.project_url, comments=excluded.comments"
+    )
+
 
+def iter_new_papers(local_db: PipelineDB, d1: Optional[D1Client], table_name: str,
+                    limit: Optional[int] = None, chunk_size: int = 500) -> Iterator[Dict]:
+    """Yield local papers not yet in D1 (most recent first), stopping after limit.
+    
+    Local papers are read in chunks and each chunk's IDs are checked against D1.
+    Pass d1=None to skip the check and yield every paper.
+    """
+    rows = local_db.conn.execute("SELECT * FROM papers ORDER BY submitted_date DESC")
+    count = 0
+    while chunk := [dict(row) for row in islice(rows, chunk_size)]:
+        if d1 is not None:
+            existing = get_existing_ids_d1(d1, table_name, [p['id'] for p in chunk])
+            chunk = [p for p in chunk if p['id'] not in existing]
+        for paper in chunk:
+            if limit and count >= limit:
+                return
+            count += 1
+            yield paper
 
-def batch_upload_papers(d1: D1Client, papers: list, category: str, batch_size: int = 50):
-    """Batch upload papers to D1 with minimal API calls"""
+
+def batch_upload_papers(d1: D1Client, papers: Iterable[Dict], category: str, batch_size: int = 500) -> int:
+    """Batch upload papers to D1 with minimal API calls. Returns the number of papers uploaded."""
     table_name = f'papers_{category.lower().replace(".", "_")}'
-    total = len(papers)
+    sql = upsert_sql(table_name)
+    papers = iter(papers)
+    total = 0
+    batch_num = 0
     
-    print(f"\nUploading {total:,} papers in batches of {batch_size}...", file=sys.stderr)
+    print(f"\nUploading papers in batches of {batch_size}...", file=sys.stderr)
     
-    for i in range(0, total, batch_size):
-        batch = papers[i:i + batch_size]
-        
-        # Build batch INSERT statements
-        sql_statements = []
-        for p in batch:
-            # Escape single quotes
-            def esc(v):
-                if v is None:
-                    return "NULL"
-                return f"'{str(v).replace(chr(39), chr(39)*2)}'"
-            
-            sql_statements.append(
-                f"INSERT INTO {table_name} "
-                f"(id, title, authors, categories, primary_category, abstract, "
-                f"submitted_date, announce_date, scraped_date, pdf_url, code_url, project_url, comments, created_at) "
-                f"VALUES ({esc(p['id'])}, {esc(p['title'])}, {esc(p['authors'])}, {esc(p['categories'])}, "
-                f"{esc(p['primary_category'])}, {esc(p['abstract'])}, {esc(p['submitted_date'])}, "
-                f"{esc(p['announce_date'])}, {esc(p['scraped_date'])}, {esc(p['pdf_url'])}, "
-                f"{esc(p['code_url'])}, {esc(p['project_url'])}, {esc(p['comments'])}, {esc(p['created_at'])}) "
-                f"ON CONFLICT(id) DO UPDATE SET title=excluded.title, authors=excluded.authors, "
-                f"abstract=excluded.abstract, submitted_date=excluded.submitted_date, announce_date=excluded.announce_date, "
-                f"scraped_date=excluded.scraped_date, pdf_url=excluded.pdf_url, code_url=excluded.code_url, "
-                f"project_url=excluded.project_url, comments=excluded.comments"
-            )
-        
-        # Execute batch
-        sql = ';\n'.join(sql_statements) + ';'
-        
+    while batch := list(islice(papers, batch_size)):
+        batch_num += 1
         try:
-            d1.query(sql)  # Using query method which sends SQL via HTTP API
-            batch_num = i // batch_size + 1
-            total_batches = (total - 1) // batch_size + 1
-            print(f"  ✓ Batch {batch_num}/{total_batches} ({len(batch)} papers)", file=sys.stderr)
+            # One statement template, one parameter row per paper
+            d1.execute_many(sql, ([p[col] for col in UPLOAD_COLUMNS] for p in batch))
+            total += len(batch)
+            print(f"  ✓ Batch {batch_num} ({len(batch)} papers, {total:,} total)", file=sys.stderr)
         except Exception as e:
-            print(f"  ✗ Batch {i//batch_size + 1} failed: {e}", file=sys.stderr)
+            print(f"  ✗ Batch {batch_num} failed: {e}", file=sys.stderr)
             raise
+    
+    return total
 
 
 def main(
     db: str,
     category: str,
     limit: Optional[int] = None,
-    batch_size: int = 100,
+    batch_size: int = 500,
     force: bool = False,
 ) -> None:
     """
@@ -102,43 +125,34 @@ def main(
     print(f"Category: {category}", file=sys.stderr)
     print(f"Database: {db_path.name}", file=sys.stderr)
     
-    # 1. Load local papers (all, most recent first)
+    # 1. Open local papers (streamed later, most recent first)
     local_db = PipelineDB(str(db_path))
-    cursor = local_db.conn.cursor()
-    cursor.execute("SELECT * FROM papers ORDER BY submitted_date DESC")
-    all_papers = [dict(row) for row in cursor.fetchall()]
+    local_total = local_db.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
     print(f"\nLoading local papers...", file=sys.stderr)
-    print(f"  Found {len(all_papers):,} total papers", file=sys.stderr)
+    print(f"  Found {local_total:,} total papers", file=sys.stderr)
     
-    # 2. Query D1 for existing, then filter and upload
+    # 2. Check D1 for existing IDs chunk by chunk while uploading
     d1 = D1Client({
         'account_id': config.CLOUDFLARE_ACCOUNT_ID,
         'database_id': config.D1_DATABASE_ID,
         'api_token': config.D1_API_TOKEN
     })
     
-    existing = set() if force else get_existing_papers_d1(d1, category)
+    table_name = f'papers_{category.lower().replace(".", "_")}'
+    check_existing = not force and d1_table_exists(d1, table_name)
     if force:
         print(f"  Skipping D1 check (--force)", file=sys.stderr)
     
-    # 3. Filter out existing, then apply limit
-    to_upload = [p for p in all_papers if p['id'] not in existing]
-    total_new = len(to_upload)
-    
-    if limit and total_new > limit:
-        to_upload = to_upload[:limit]
-        print(f"\n{limit:,} new papers to upload (limited from {total_new:,} available)", file=sys.stderr)
-    elif total_new > 0:
-        print(f"\n{total_new:,} new papers to upload", file=sys.stderr)
-    else:
-        print("\n✓ All papers already in D1!", file=sys.stderr)
-        local_db.close()
-        return
-    
-    # 4. Batch upload
+    # 3. Stream papers not in D1 (up to limit) straight into batch upload
+    if limit:
+        print(f"\nUploading up to {limit:,} new papers", file=sys.stderr)
     try:
-        batch_upload_papers(d1, to_upload, category, batch_size=batch_size)
-        print(f"\n✓ Upload complete!", file=sys.stderr)
+        new_papers = iter_new_papers(local_db, d1 if check_existing else None, table_name, limit)
+        uploaded = batch_upload_papers(d1, new_papers, category, batch_size=batch_size)
+        if uploaded:
+            print(f"\n✓ Upload complete! ({uploaded:,} papers)", file=sys.stderr)
+        else:
+            print("\n✓ All papers already in D1!", file=sys.stderr)
     except Exception as e:
         print(f"\nUpload failed: {e}", file=sys.stderr)
         sys.exit(1)
@@ -4,77 +4,128 @@ Extract figures from arXiv PDFs.
 Adapted from worker/extract_figures.py with simplified figure selection.
 """
 
+import os
 import sys
 import re
-import tempfile
 import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 
 import fitz
 import requests
 import tyro
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 # TODO: replace by object detection model trained on academic papers
 
 sys.path.append(str(Path(__file__).parent.parent))
 import config
 
 
-_last_pdf_download = 0
+_download_state = threading.local()
 PDF_MIN_INTERVAL = config.ARXIV_RATE_LIMIT
 
+# Shared keep-alive session for the download threads (one pooled connection each).
+# Dropped keep-alive connections are retried; HTTP error statuses (e.g. 503) are
+# still returned to the caller.
+_PDF_SESSION = requests.Session()
+_PDF_SESSION.mount("https://", HTTPAdapter(
+    pool_maxsize=max(8, config.MAX_WORKERS),
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(), respect_retry_after_header=False),
+))
 
-def download_pdf(arxiv_id: str, output_dir: Optional[Path] = None) -> Path:
-    """Download PDF from arXiv with rate limiting."""
-    global _last_pdf_download
-    
-    if output_dir is None:
-        output_dir = Path(tempfile.gettempdir())
+RENDER_ZOOM = 2.0
+_RENDER_MATRIX = fitz.Matrix(RENDER_ZOOM, RENDER_ZOOM)
+# Rendered figures at or below this size (pixels) are discarded before encoding
+MIN_RENDER_WIDTH = 300
+MIN_RENDER_HEIGHT = 150
+
+# Captions whose tops are closer than this (points) sit side by side in one row
+ROW_TOLERANCE = 50
+
+_FIG_CAPTION_RE = re.compile(r'^\s*(Figure|Fig\.?)\s+\d+', re.IGNORECASE)
+
+
+def download_pdf(arxiv_id: str, verbose: bool = True) -> bytes:
+    """Download PDF from arXiv with rate limiting. Returns the PDF bytes (nothing is written to disk).
     
+    The rate limit applies per thread, so each download thread behaves like one
+    sequential downloader.
+    """
     url = f"https://arxiv.org/pdf/{arxiv_id}.pdf"
-    output_path = output_dir / f"{arxiv_id}.pdf"
     
-    elapsed = time.time() - _last_pdf_download
+    elapsed = time.monotonic() - getattr(_download_state, 'last', float('-inf'))
     if elapsed < PDF_MIN_INTERVAL:
         wait = PDF_MIN_INTERVAL - elapsed
-        print(f"  Rate limiting: waiting {wait:.1f}s...", file=sys.stderr)
+        if verbose:
+            print(f"  Rate limiting: waiting {wait:.1f}s...", file=sys.stderr)
         time.sleep(wait)
     
-    print(f"Downloading PDF for {arxiv_id}...", file=sys.stderr)
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
+    if verbose:
+        print(f"Downloading PDF for {arxiv_id}...", file=sys.stderr)
+    with _PDF_SESSION.get(url, timeout=30, stream=True) as response:
+        response.raise_for_status()
+        pdf_bytes = b''.join(response.iter_content(chunk_size=1 << 16))
     
-    _last_pdf_download = time.time()
+    _download_state.last = time.monotonic()
     
-    with open(output_path, 'wb') as f:
-        f.write(response.content)
+    return pdf_bytes
+
+
+def _open_pdf(pdf: Union[Path, bytes]) -> fitz.Document:
+    """Open a PDF from a path or from in-memory bytes."""
+    if isinstance(pdf, bytes):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
+
+def _page_image_rects(page) -> Tuple[List[float], List]:
+    """Collect the placement rects of every image on a page, sorted by vertical center.
     
-    return output_path
+    Returns (center_ys, rects) so callers can bisect on the y range of a search rect.
+    """
+    image_rects = []
+    # An xref can be listed more than once; get_image_rects already returns all its placements
+    for xref in dict.fromkeys(img[0] for img in page.get_images()):
+        try:
+            image_rects.extend(page.get_image_rects(xref) or [])
+        except Exception:
+            continue
+    image_rects.sort(key=lambda r: (r.y0 + r.y1) / 2)
+    return [(r.y0 + r.y1) / 2 for r in image_rects], image_rects
 
 
-def _find_images_in_rect(page, rect, left, right) -> List:
+def _find_images_in_rect(image_index, rect, left, right) -> List:
     """Find images whose centers are within the given rectangle and horizontal bounds."""
+    center_ys, image_rects = image_index
     images = []
-    for img in page.get_images():
-        try:
-            img_rects = page.get_image_rects(img[0])
-            if img_rects:
-                for bbox in img_rects:
-                    if bbox.intersects(rect):
-                        cy = (bbox.y0 + bbox.y1) / 2
-                        cx = (bbox.x0 + bbox.x1) / 2
-                        if rect.y0 <= cy <= rect.y1 and left <= cx <= right:
-                            images.append(bbox)
-        except:
-            continue
+    for bbox in image_rects[bisect_left(center_ys, rect.y0):bisect_right(center_ys, rect.y1)]:
+        cx = (bbox.x0 + bbox.x1) / 2
+        if left <= cx <= right and bbox.intersects(rect):
+            images.append(bbox)
     return images
 
 
-def _get_horizontal_bounds(caption_info, figure_captions, page_width) -> tuple:
+def _caption_rows(figure_captions) -> Dict[int, List[Dict]]:
+    """Bucket captions into ROW_TOLERANCE-high bands of the page by their y position."""
+    rows = defaultdict(list)
+    for c in figure_captions:
+        rows[int(c['y'] // ROW_TOLERANCE)].append(c)
+    return rows
+
+
+def _get_horizontal_bounds(caption_info, caption_rows, page_width) -> tuple:
     """Determine horizontal search boundaries for side-by-side figures."""
     caption_bbox = caption_info['bbox']
-    captions_same_row = [c for c in figure_captions 
-                         if abs(c['y'] - caption_info['y']) < 50 and c != caption_info]
+    y = caption_info['y']
+    row = int(y // ROW_TOLERANCE)
+    # Captions less than ROW_TOLERANCE apart are always in the same or an adjacent band
+    nearby = caption_rows.get(row - 1, []) + caption_rows.get(row, []) + caption_rows.get(row + 1, [])
+    captions_same_row = [c for c in nearby if abs(c['y'] - y) < ROW_TOLERANCE and c != caption_info]
     
     if captions_same_row:
         all_in_row = sorted([caption_info] + captions_same_row, 
@@ -90,103 +141,149 @@ def _get_horizontal_bounds(caption_info, figure_captions, page_width) -> tuple:
     return left, right
 
 
-def extract_figures(pdf_path: Path) -> List[Dict]:
-    """
-    Extract complete figures by rendering page regions.
-    """
-    print(f"Extracting figures from {pdf_path}...", file=sys.stderr)
-    doc = fitz.open(pdf_path)
+def _extract_page_figures(page) -> List[Dict]:
+    """Extract the figures of a single page."""
+    page_num = page.number
     figures = []
     
-    for page_num, page in enumerate(doc):
-        blocks = page.get_text("blocks")
-        page_h = page.rect.height
-        page_w = page.rect.width
+    # Figures are located via raster images, so pages without any have nothing to extract
+    image_index = _page_image_rects(page)
+    if not image_index[1]:
+        return []
+    
+    blocks = page.get_text("blocks")
+    page_h = page.rect.height
+    page_w = page.rect.width
+    
+    figure_captions = []
+    for block in blocks:
+        if len(block) >= 5:
+            text = str(block[4]).strip()
+            match = _FIG_CAPTION_RE.match(text)
+            if match:
+                bbox = fitz.Rect(block[:4])
+                figure_captions.append({
+                    'text': text[:200], 'prefix': match.group(0).strip(),
+                    'bbox': bbox, 'y': bbox.y0
+                })
+    figure_captions.sort(key=lambda x: x['y'])
+    
+    if not figure_captions:
+        return []
+    
+    caption_rows = _caption_rows(figure_captions)
+    
+    for i, cap in enumerate(figure_captions):
+        caption_bbox = cap['bbox']
+        
+        safe_top = figure_captions[i-1]['bbox'].y1 + 10 if i > 0 else 0
         
-        figure_captions = []
-        for block in blocks:
-            if len(block) >= 5:
-                text = str(block[4]).strip()
-                match = re.match(r'^\s*(Figure|Fig\.?)\s+\d+', text, re.IGNORECASE)
-                if match:
-                    bbox = fitz.Rect(block[:4])
-                    figure_captions.append({
-                        'text': text[:200], 'prefix': match.group(0).strip(),
-                        'bbox': bbox, 'y': bbox.y0
-                    })
-        figure_captions.sort(key=lambda x: x['y'])
+        if i < len(figure_captions) - 1:
+            bottom = min(caption_bbox.y0, figure_captions[i+1]['bbox'].y0 - 10)
+        else:
+            bottom = caption_bbox.y0
         
-        if not figure_captions:
+        safe_top = max(0, min(safe_top, page_h))
+        bottom = max(0, min(bottom, page_h))
+        
+        available = bottom - safe_top
+        is_tight = available < 150
+        
+        top = safe_top if is_tight else max(safe_top, caption_bbox.y0 - page_h * 0.6)
+        if bottom - top < 30:
+            top = max(safe_top, caption_bbox.y0 - 200)
+        
+        left, right = _get_horizontal_bounds(cap, caption_rows, page_w)
+        
+        rect = fitz.Rect(left, top, right, bottom)
+        images = _find_images_in_rect(image_index, rect, left, right)
+        
+        if images:
+            min_top = min(r.y0 for r in images)
+            if min_top < top - 20:
+                new_top = max(safe_top, min_top - 10)
+                if new_top < top - 20:
+                    images = _find_images_in_rect(image_index, fitz.Rect(left, new_top, right, bottom), left, right)
+                    top = new_top
+        
+        if not images:
             continue
         
-        for i, cap in enumerate(figure_captions):
-            caption_bbox = cap['bbox']
-            
-            safe_top = figure_captions[i-1]['bbox'].y1 + 10 if i > 0 else 0
-            
-            if i < len(figure_captions) - 1:
-                bottom = min(caption_bbox.y0, figure_captions[i+1]['bbox'].y0 - 10)
-            else:
-                bottom = caption_bbox.y0
-            
-            safe_top = max(0, min(safe_top, page_h))
-            bottom = max(0, min(bottom, page_h))
-            
-            available = bottom - safe_top
-            is_tight = available < 150
-            
-            top = safe_top if is_tight else max(safe_top, caption_bbox.y0 - page_h * 0.6)
-            if bottom - top < 30:
-                top = max(safe_top, caption_bbox.y0 - 200)
-            
-            left, right = _get_horizontal_bounds(cap, figure_captions, page_w)
-            
-            rect = fitz.Rect(left, top, right, bottom)
-            images = _find_images_in_rect(page, rect, left, right)
-            
-            if images:
-                min_top = min(r.y0 for r in images)
-                if min_top < top - 20:
-                    new_top = max(safe_top, min_top - 10)
-                    if new_top < top - 20:
-                        images = _find_images_in_rect(page, fitz.Rect(left, new_top, right, bottom), left, right)
-                        top = new_top
-            
-            if not images:
-                continue
-            
-            bbox = (min(r.y0 for r in images), max(r.y1 for r in images),
-                   min(r.x0 for r in images), max(r.x1 for r in images))
-            
-            fig_rect = fitz.Rect(
-                max(0, bbox[2] - 10), max(safe_top, bbox[0] - 10),
-                min(page_w, bbox[3] + 10), min(page_h, caption_bbox.y1 + 3)
-            )
-            
-            min_h, min_w = (30, 60) if is_tight else (40, 80)
-            if fig_rect.height < min_h or fig_rect.width < min_w or fig_rect.height > page_h * 0.85:
+        bbox = (min(r.y0 for r in images), max(r.y1 for r in images),
+               min(r.x0 for r in images), max(r.x1 for r in images))
+        
+        fig_rect = fitz.Rect(
+            max(0, bbox[2] - 10), max(safe_top, bbox[0] - 10),
+            min(page_w, bbox[3] + 10), min(page_h, caption_bbox.y1 + 3)
+        )
+        
+        min_h, min_w = (30, 60) if is_tight else (40, 80)
+        if fig_rect.height < min_h or fig_rect.width < min_w or fig_rect.height > page_h * 0.85:
+            continue
+        
+        render_size = (fig_rect * _RENDER_MATRIX).irect
+        if render_size.width <= MIN_RENDER_WIDTH or render_size.height <= MIN_RENDER_HEIGHT:
+            continue
+        
+        try:
+            # Opaque RGB renders decode downstream without mode conversion. Crops stay lossless (PNG):
+            # most are line art and text, and process_figures re-encodes them lossily to WebP anyway
+            pix = page.get_pixmap(matrix=_RENDER_MATRIX, clip=fig_rect, alpha=False, colorspace=fitz.csRGB)
+            if pix.width <= MIN_RENDER_WIDTH or pix.height <= MIN_RENDER_HEIGHT:
                 continue
-            
-            try:
-                pix = page.get_pixmap(matrix=fitz.Matrix(2.0, 2.0), clip=fig_rect)
-                figures.append({
-                    'page': page_num,
-                    'width': pix.width,
-                    'height': pix.height,
-                    'bytes': pix.tobytes("png"),
-                    'caption': cap['text'],
-                    'caption_prefix': cap['prefix'],
-                    'format': 'png'
-                })
-                note = " [tight]" if is_tight else ""
-                print(f"  Page {page_num+1}: {cap['prefix']} ({pix.width}x{pix.height}){note}", file=sys.stderr)
-            except Exception as e:
-                print(f"  Error rendering {cap['prefix']}: {e}", file=sys.stderr)
+            figures.append({
+                'page': page_num,
+                'width': pix.width,
+                'height': pix.height,
+                'bytes': pix.tobytes("png"),
+                'caption': cap['text'],
+                'caption_prefix': cap['prefix'],
+                'format': 'png'
+            })
+            note = " [tight]" if is_tight else ""
+            print(f"  Page {page_num+1}: {cap['prefix']} ({pix.width}x{pix.height}){note}", file=sys.stderr)
+        except Exception as e:
+            print(f"  Error rendering {cap['prefix']}: {e}", file=sys.stderr)
     
-    doc.close()
-    filtered = [f for f in figures if f['width'] > 300 and f['height'] > 150]
-    print(f"Extracted {len(figures)} figures, {len(filtered)} after filtering", file=sys.stderr)
-    return filtered
+    return figures
+
+
+def _extract_pages(args: Tuple[Union[Path, bytes], int, int]) -> List[Tuple[int, List[Dict]]]:
+    """Worker process: open the PDF and extract figures from every step-th page starting at start."""
+    pdf, start, step = args
+    with _open_pdf(pdf) as doc:
+        return [(page_num, _extract_page_figures(doc.load_page(page_num)))
+                for page_num in range(start, doc.page_count, step)]
+
+
+def extract_figures(pdf: Union[Path, bytes], workers: int = 1) -> List[Dict]:
+    """
+    Extract complete figures by rendering page regions.
+    
+    Accepts a path or the PDF bytes returned by download_pdf.
+    With workers > 1, pages are split across processes that each open the PDF
+    (PyMuPDF documents cannot be shared between threads). Figures keep page order.
+    """
+    source = f"{len(pdf):,} bytes" if isinstance(pdf, bytes) else pdf
+    print(f"Extracting figures from {source}...", file=sys.stderr)
+    doc = _open_pdf(pdf)
+    
+    if workers > 1 and doc.page_count > 1 and (os.cpu_count() or 1) > 1:
+        # Each process holds its own copy of the document, so never exceed the cores that can use it
+        step = min(workers, doc.page_count, os.cpu_count() or 1)
+        doc.close()
+        with ProcessPoolExecutor(max_workers=step) as executor:
+            pages = [page for chunk in executor.map(_extract_pages, [(pdf, start, step) for start in range(step)])
+                     for page in chunk]
+        figures = [fig for _, page_figures in sorted(pages, key=lambda p: p[0]) for fig in page_figures]
+    else:
+        figures = []
+        for page in doc:
+            figures.extend(_extract_page_figures(page))
+        doc.close()
+    
+    print(f"Extracted {len(figures)} figures", file=sys.stderr)
+    return figures
 
 
 def select_figures_simple(figures: List[Dict], 
@@ -240,9 +337,9 @@ def select_figures_vlm(figures: List[Dict]) -> Tuple[Optional[Dict], Optional[Di
     return select_figures_simple(figures)
 
 
-def main(arxiv_id: str, save_dir: Optional[Path] = None) -> None:
-    pdf_path = download_pdf(arxiv_id)
-    figures = extract_figures(pdf_path)
+def main(arxiv_id: str, save_dir: Optional[Path] = None, workers: int = 1) -> None:
+    pdf_bytes = download_pdf(arxiv_id)
+    figures = extract_figures(pdf_bytes, workers=workers)
     teaser, arch = select_figures_simple(figures)
 
     print(f"\nExtracted {len(figures)} figures")
@@ -254,11 +351,7 @@ def main(arxiv_id: str, save_dir: Optional[Path] = None) -> None:
     if save_dir:
         save_dir.mkdir(parents=True, exist_ok=True)
         for idx, fig in enumerate(figures, start=1):
-            img = fig.get("image")
-            if img is not None:
-                img.save(save_dir / f"{arxiv_id}_fig_{idx}.png")
-
-    pdf_path.unlink()
+            (save_dir / f"{arxiv_id}_fig_{idx}.{fig['format']}").write_bytes(fig['bytes'])
 
 
 if __name__ == "__main__":
@@ -1,11 +1,14 @@
 """Extract figures for D1 papers and upload to R2."""
 
+import os
 import sys
-import io
+import threading
 from pathlib import Path
 from contextlib import redirect_stderr
-from typing import Dict, Optional, Set, Tuple
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, Optional, Tuple
 from multiprocessing import Pool
+from collections import deque
+from concurrent.futures import CancelledError, Executor, ThreadPoolExecutor
 
 import requests
 import tyro
@@ -20,27 +23,44 @@ from d1_client import D1Client
 
 
 FAILED_EXTRACTIONS_FILE = Path("pipeline/failed_extractions.txt")  # TODO: find better solution for failed extractions
+# Papers whose figure rows are collected before one batched D1 write
+FIGURE_FLUSH_PAPERS = 50
 
 
 class ServiceUnavailableError(RuntimeError):
     """Raised when upstream responds with HTTP 503 (rate limiting)."""
 
 
-def load_failed_extractions() -> Set[str]:
-    """Return paper IDs that previously failed extraction."""
-    if not FAILED_EXTRACTIONS_FILE.exists():
-        return set()
+_failed_cache: Tuple[Optional[int], FrozenSet[str]] = (None, frozenset())
+
+
+def load_failed_extractions() -> FrozenSet[str]:
+    """Return paper IDs that previously failed extraction (re-read only when the file changes)."""
+    global _failed_cache
+    try:
+        mtime = FAILED_EXTRACTIONS_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return frozenset()
     
-    with open(FAILED_EXTRACTIONS_FILE) as f:
-        return {line.strip() for line in f if line.strip()}
+    if _failed_cache[0] != mtime:
+        with open(FAILED_EXTRACTIONS_FILE) as f:
+            _failed_cache = (mtime, frozenset(line.strip() for line in f if line.strip()))
+    return _failed_cache[1]
 
 
 def mark_failed_extraction(paper_id: str):
-    """Record that a paper failed extraction."""
+    """Record that a paper failed extraction.
+    
+    A single O_APPEND write per line is atomic for small writes on POSIX, so
+    concurrent pool workers never interleave partial lines.
+    """
     FAILED_EXTRACTIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(FAILED_EXTRACTIONS_FILE, 'a') as f:
-        f.write(f"{paper_id}\n")
+    fd = os.open(FAILED_EXTRACTIONS_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, f"{paper_id}\n".encode())
+    finally:
+        os.close(fd)
 
 
 def get_d1_config(config_module) -> Dict:
@@ -52,42 +72,81 @@ def get_d1_config(config_module) -> Dict:
     }
 
 
-def process_paper(args_tuple: Tuple[str, Dict, Dict, bool]) -> Dict:
-    """Worker function: download PDF, extract figures, select, and upload to R2. Returns result dict."""
-    paper_id, r2_config, d1_config, verbose = args_tuple
+def prefetch(executor: Executor, fn: Callable, items: Iterable, depth: int) -> Iterator:
+    """Map fn over items on executor in order, keeping at most depth calls ahead of the consumer."""
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def fetch_pdf(paper_id: str, verbose: bool) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """Download stage: fetch one PDF. Returns (paper_id, pdf_bytes, error); HTTP 503 aborts the run."""
+    try:
+        if verbose:
+            print(f"[{paper_id}] Downloading PDF...", file=sys.stderr)
+        return paper_id, download_pdf(paper_id, verbose=verbose), None
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 503:
+            raise ServiceUnavailableError("Received HTTP 503 from arXiv/R2") from e
+        return paper_id, None, str(e)
+    except Exception as e:
+        return paper_id, None, str(e)
+
+
+# Per-process worker state, set once by _worker_init
+_worker: Dict = {}
+
+
+def _worker_init(r2_config: Dict, verbose: bool):
+    """Pool initializer: set configs and the quiet-mode stderr sink once per worker process."""
+    stderr_target = sys.stderr if verbose else open(os.devnull, 'w')
+    _worker.update(r2_config=r2_config, verbose=verbose, stderr_target=stderr_target)
+
+
+def process_paper(args_tuple: Tuple[str, Optional[bytes], Optional[str]]) -> Dict:
+    """Worker function: extract figures from a downloaded PDF, select, and upload to R2.
+    
+    Returns result dict; D1 rows for uploaded figures are returned under 'figures' for main() to write in batches.
+    """
+    paper_id, pdf_bytes, download_error = args_tuple
+    r2_config, verbose, stderr_target = _worker['r2_config'], _worker['verbose'], _worker['stderr_target']
     
     result = {
         'paper_id': paper_id,
         'success': False,
         'figures_uploaded': 0,
+        'figures': [],
         'error': None
     }
     
-    try:
-        d1 = D1Client(d1_config)
-        
-        stderr_target = sys.stderr if verbose else io.StringIO()
-        
+    if download_error:
+        result['error'] = download_error
+        mark_failed_extraction(paper_id)
         if verbose:
-            print(f"[{paper_id}] Downloading PDF...", file=sys.stderr)
-        with redirect_stderr(stderr_target):
-            pdf_path = download_pdf(paper_id)
-        
+            print(f"[{paper_id}] ✗ Error: {download_error}", file=sys.stderr)
+        else:
+            print(f"{paper_id} ... failed due to: {download_error}", file=sys.stderr)
+        return result
+    
+    try:
         if verbose:
             print(f"[{paper_id}] Extracting figures...", file=sys.stderr)
         with redirect_stderr(stderr_target):
-            figures = extract_figures(pdf_path)
-        
-        with redirect_stderr(stderr_target):
+            figures = extract_figures(pdf_bytes)
             teaser, architecture = select_figures_simple(
                 figures,
                 min_width=config.FIGURE_MIN_WIDTH,
                 min_height=config.FIGURE_MIN_HEIGHT
             )
+        # Only the selected figures are needed from here on; free the other encoded crops before uploading
+        del figures
         
         if not teaser and not architecture:
             mark_failed_extraction(paper_id)
-            pdf_path.unlink()
             result['error'] = 'No figures'
             if verbose:
                 print(f"[{paper_id}] No figures found", file=sys.stderr)
@@ -95,41 +154,31 @@ def process_paper(args_tuple: Tuple[str, Dict, Dict, bool]) -> Dict:
                 print(f"{paper_id} ... failed due to: No figures", file=sys.stderr)
             return result
         
-        if teaser:
-            if verbose:
-                print(f"[{paper_id}] Processing teaser...", file=sys.stderr)
-            with redirect_stderr(stderr_target):
-                teaser_data = process_and_upload_figure(
-                    teaser['bytes'], paper_id, 'teaser', r2_config,
-                    full_size=config.FIGURE_FULL_SIZE,
-                    thumb_size=config.FIGURE_THUMB_SIZE
-                )
-            
-            d1.insert_figure(
-                paper_id, 'teaser',
-                teaser_data['r2_key'], teaser_data['thumb_key'],
-                teaser['width'], teaser['height']
-            )
-            result['figures_uploaded'] += 1
+        selected = [(kind, figure) for kind, figure in (('teaser', teaser), ('architecture', architecture)) if figure]
+        if verbose:
+            print(f"[{paper_id}] Processing {', '.join(kind for kind, _ in selected)}...", file=sys.stderr)
         
-        if architecture:
-            if verbose:
-                print(f"[{paper_id}] Processing architecture...", file=sys.stderr)
-            with redirect_stderr(stderr_target):
-                arch_data = process_and_upload_figure(
-                    architecture['bytes'], paper_id, 'architecture', r2_config,
+        # Encoding (PIL) and uploads (boto3) release the GIL, so both figures run side by side
+        with redirect_stderr(stderr_target), ThreadPoolExecutor(max_workers=len(selected)) as executor:
+            futures = [
+                executor.submit(
+                    process_and_upload_figure,
+                    figure['bytes'], paper_id, kind, r2_config,
                     full_size=config.FIGURE_FULL_SIZE,
                     thumb_size=config.FIGURE_THUMB_SIZE
                 )
-            
-            d1.insert_figure(
-                paper_id, 'architecture',
-                arch_data['r2_key'], arch_data['thumb_key'],
-                architecture['width'], architecture['height']
-            )
+                for kind, figure in selected
+            ]
+            uploaded = [future.result() for future in futures]
+        
+        for (kind, figure), data in zip(selected, uploaded):
+            result['figures'].append((
+                paper_id, kind,
+                data['r2_key'], data['thumb_key'],
+                figure['width'], figure['height']
+            ))
             result['figures_uploaded'] += 1
         
-        pdf_path.unlink()
         result['success'] = True
         if verbose:
             print(f"[{paper_id}] ✓ Complete ({result['figures_uploaded']} figures)", file=sys.stderr)
@@ -169,13 +218,13 @@ def main(
 
     d1_config = get_d1_config(config)
     r2_config = get_r2_config(config)
+    d1 = D1Client(d1_config)
 
     if paper_id:
         info("\nMode: Single paper test")
         info(f"Paper: {paper_id}")
         paper_ids = [paper_id]
     else:
-        d1 = D1Client(d1_config)
         info(f"\nQuerying D1 for {category} papers without figures...")
         paper_ids_all = d1.get_papers_needing_figures(category=category, limit=max_count * 2)
         info(f"  Found {len(paper_ids_all)} papers without figures")
@@ -192,39 +241,89 @@ def main(
         return
 
     info(f"\nProcessing {len(paper_ids)} papers...")
-    worker_args = [(paper_id, r2_config, d1_config, verbose) for paper_id in paper_ids]
+    # Two stages: PDFs download in background threads (network-bound) while
+    # already-downloaded papers are extracted and uploaded (CPU-bound).
+    # At most `workers` downloads run ahead, and at most 2 * workers papers are
+    # handed to the pool before their results are collected, so memory stays
+    # bounded however many papers are queued.
+    downloader = ThreadPoolExecutor(max_workers=max(1, workers))
+    downloads = prefetch(downloader, lambda pid: fetch_pdf(pid, verbose), paper_ids, depth=max(1, workers))
+    slots = threading.BoundedSemaphore(2 * max(1, workers))
+    stopping = threading.Event()
+    # Results whose figures are uploaded to R2 but not yet written to D1
+    pending_results = []
+    
+    def flush_figures():
+        batch = pending_results[:]
+        pending_results.clear()
+        if not batch:
+            return
+        rows = [row for r in batch for row in r['figures']]
+        # Transient D1 errors are already retried (with backoff) by the client
+        try:
+            d1.insert_figures_batch(rows)
+        except Exception as e:
+            info(f"\n✗ Failed to write {len(rows)} figures to D1: {e}")
+            # Uploaded but unrecorded: not a success, and not a failed extraction either
+            for r in batch:
+                r['success'] = False
+                r['error'] = f"D1 write failed: {e}"
+    
+    def worker_args():
+        try:
+            for paper_id, pdf_bytes, error in downloads:
+                while not slots.acquire(timeout=0.1):
+                    if stopping.is_set():
+                        return
+                yield (paper_id, pdf_bytes, error)
+        except CancelledError:
+            return
     
     def collect(iterable, pool: Optional[Pool] = None) -> list:
         results_local = []
         try:
             for item in iterable:
                 results_local.append(item)
+                slots.release()
+                if item['figures']:
+                    pending_results.append(item)
+                    if len(pending_results) >= FIGURE_FLUSH_PAPERS:
+                        flush_figures()
         except ServiceUnavailableError as exc:
             info("\nHTTP 503 received. Stopping all workers...")
+            stopping.set()
+            downloader.shutdown(wait=False, cancel_futures=True)
             if pool is not None:
                 pool.terminate()
                 pool.join()
             raise SystemExit(str(exc)) from exc
         return results_local
 
-    if workers > 1:
-        with Pool(workers) as pool:
-            iterator = pool.imap(process_paper, worker_args)
-            if not verbose:
-                iterator = tqdm(iterator, total=len(worker_args), desc="Processing papers", unit="paper")
-            results = collect(iterator, pool)
-    else:
-        iterator = worker_args if verbose else tqdm(worker_args, desc="Processing papers", unit="paper")
+    try:
+        if workers > 1:
+            with Pool(workers, initializer=_worker_init, initargs=(r2_config, verbose)) as pool:
+                iterator = pool.imap(process_paper, worker_args())
+                if not verbose:
+                    iterator = tqdm(iterator, total=len(paper_ids), desc="Processing papers", unit="paper")
+                results = collect(iterator, pool)
+        else:
+            _worker_init(r2_config, verbose)
+            iterator = worker_args() if verbose else tqdm(worker_args(), total=len(paper_ids), desc="Processing papers", unit="paper")
 
-        def sequential():
-            for arg in iterator:
-                yield process_paper(arg)
+            def sequential():
+                for arg in iterator:
+                    yield process_paper(arg)
 
-        results = collect(sequential())
+            results = collect(sequential())
+    finally:
+        stopping.set()
+        downloader.shutdown(wait=False, cancel_futures=True)
+        flush_figures()
 
     successful = [r for r in results if r['success']]
     failed = [r for r in results if not r['success']]
-    total_figures = sum(r['figures_uploaded'] for r in results)
+    unrecorded = [r for r in failed if r['figures']]
+    total_figures = sum(r['figures_uploaded'] for r in successful)
 
     info(f"\n{'=' * 60}\nSummary\n{'=' * 60}")
     info(f"Processed:  {len(successful)}/{len(results)} papers")
@@ -235,6 +334,12 @@ def main(
         for r in failed[:5]:
             info(f"  • {r['paper_id']}: {r['error']}")
 
+    if unrecorded:
+        info(f"Unrecorded: {len(unrecorded)} papers uploaded to R2 but not written to D1")
+        for r in unrecorded:
+            info(f"  • {r['paper_id']}")
+        info("  Run sync_r2_to_d1_figures.py to record them.")
+
     info("\n✓ Complete!")
 
 
@@ -6,6 +6,8 @@ Converts figures to WebP and uploads to Cloudflare R2.
 
 import sys
 import io
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict
 
 from PIL import Image
@@ -13,6 +15,43 @@ import boto3
 from botocore.client import Config
 
 
+def _decode_and_normalize(img_bytes: bytes) -> Image.Image:
+    """Decode image bytes and convert to RGB or L, flattening transparency onto white."""
+    img = Image.open(io.BytesIO(img_bytes))
+    
+    if img.mode in ('RGB', 'L'):
+        return img
+    
+    if img.mode in ('RGBA', 'LA'):
+        # Passing the image itself as mask uses its alpha band without split() copying every band
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img)
+        return background
+    
+    # CMYK, P and any other mode
+    return img.convert('RGB')
+
+
+def _resize_to_width(img: Image.Image, max_width: int, resample: int = Image.BICUBIC) -> Image.Image:
+    """Resize image maintaining aspect ratio if it is wider than max_width.
+    
+    reducing_gap lets Pillow box-reduce by an integer factor first, so the
+    resampling filter only runs over the last <3x of the downscale.
+    """
+    if img.width > max_width:
+        ratio = max_width / img.width
+        new_height = int(img.height * ratio)
+        img = img.resize((max_width, new_height), resample, reducing_gap=3.0)
+    return img
+
+
+def _encode_webp(img: Image.Image, quality: int, method: int = 4) -> bytes:
+    """Encode a normalized image as WebP (method: encoder effort 0-6, slower is smaller)."""
+    output = io.BytesIO()
+    img.save(output, format='WEBP', quality=quality, method=method)
+    return output.getvalue()
+
+
 def downsample_image(img_bytes: bytes, max_width: int = 800, quality: int = 80) -> bytes:
     """
     Resize image maintaining aspect ratio and convert to WebP.
@@ -25,28 +64,22 @@ def downsample_image(img_bytes: bytes, max_width: int = 800, quality: int = 80)
     Returns:
         Downsampled image as WebP bytes
     """
-    img = Image.open(io.BytesIO(img_bytes))
-    
-    if img.width > max_width:
-        ratio = max_width / img.width
-        new_height = int(img.height * ratio)
-        img = img.resize((max_width, new_height), Image.LANCZOS)
-    
-    if img.mode not in ('RGB', 'L'):
-        if img.mode == 'CMYK':
-            img = img.convert('RGB')
-        elif img.mode in ('RGBA', 'LA'):
-            background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[-1])
-            img = background
-        elif img.mode == 'P':
-            img = img.convert('RGB')
-        else:
-            img = img.convert('RGB')
-    
-    output = io.BytesIO()
-    img.save(output, format='WEBP', quality=quality, method=6)
-    return output.getvalue()
+    img = _decode_and_normalize(img_bytes)
+    return _encode_webp(_resize_to_width(img, max_width), quality)
+
+
+@functools.lru_cache(maxsize=4)
+def _make_client(endpoint: str, access_key: str, secret_key: str):
+    """Build an S3 client for R2 once per process and credentials, reusing its connection pool."""
+    # A dedicated session keeps client construction safe when called from threads
+    return boto3.session.Session().client(
+        's3',
+        endpoint_url=endpoint,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        config=Config(signature_version='s3v4'),
+        region_name='auto'
+    )
 
 
 def upload_to_r2(local_bytes: bytes, r2_key: str, config: Dict) -> str:
@@ -61,14 +94,7 @@ def upload_to_r2(local_bytes: bytes, r2_key: str, config: Dict) -> str:
     Returns:
         Public URL of uploaded file
     """
-    s3 = boto3.client(
-        's3',
-        endpoint_url=config['endpoint'],
-        aws_access_key_id=config['access_key'],
-        aws_secret_access_key=config['secret_key'],
-        config=Config(signature_version='s3v4'),
-        region_name='auto'
-    )
+    s3 = _make_client(config['endpoint'], config['access_key'], config['secret_key'])
     
     s3.put_object(
         Bucket=config['bucket_name'],
@@ -95,19 +121,39 @@ def process_and_upload_figure(figure_bytes: bytes, paper_id: str, kind: str,
         thumb_size: Max width for thumbnail
         
     Returns:
-        Dict with r2_key, thumb_key, and URLs
+        Dict with r2_key, thumb_key, and URLs (thumb_key == r2_key when the
+        figure is no wider than thumb_size)
     """
-    full_image = downsample_image(figure_bytes, max_width=full_size, quality=80)
-    thumb_image = downsample_image(figure_bytes, max_width=thumb_size, quality=75)
-    
+    # Decode once; the thumbnail is scaled down from the already-resized full image
+    full_pil = _resize_to_width(_decode_and_normalize(figure_bytes), full_size)
+    full_image = _encode_webp(full_pil, quality=80)
     r2_key = f"figures/{paper_id}/{kind}.webp"
+    
+    # Already thumbnail-sized: the thumbnail would be the same pixels, so reuse the full image
+    if full_pil.width <= thumb_size:
+        print(f"  Uploading {kind}: full={len(full_image)}B, thumb=full", file=sys.stderr)
+        full_url = upload_to_r2(full_image, r2_key, r2_config)
+        return {
+            'r2_key': r2_key,
+            'thumb_key': r2_key,
+            'full_url': full_url,
+            'thumb_url': full_url,
+            'full_size': len(full_image),
+            'thumb_size': len(full_image)
+        }
+    
+    thumb_image = _encode_webp(_resize_to_width(full_pil, thumb_size, Image.BOX), quality=75, method=2)
     thumb_key = f"figures/{paper_id}/{kind}_thumb.webp"
     
     print(f"  Uploading {kind}: full={len(full_image)}B, thumb={len(thumb_image)}B", 
           file=sys.stderr)
     
-    full_url = upload_to_r2(full_image, r2_key, r2_config)
-    thumb_url = upload_to_r2(thumb_image, thumb_key, r2_config)
+    # Both uploads are independent network round-trips, so run them side by side
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        full_future = executor.submit(upload_to_r2, full_image, r2_key, r2_config)
+        thumb_future = executor.submit(upload_to_r2, thumb_image, thumb_key, r2_config)
+        full_url = full_future.result()
+        thumb_url = thumb_future.result()
     
     return {
         'r2_key': r2_key,
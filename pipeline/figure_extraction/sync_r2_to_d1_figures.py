@@ -1,33 +1,80 @@
 """
 Sync R2 figures to D1 figures table.
-Scans R2 once, queries D1 once, batches inserts for minimal operations.
+Scans R2 once, queries D1 once over its HTTP API, batches inserts for minimal operations.
+
+After a clean run the newest R2 LastModified is checkpointed in SYNC_STATE_FILE;
+later runs only diff figures modified since then against D1 (use --full to
+re-check everything).
 """
 
 import sys
 import boto3
-import subprocess
-import json
+import orjson
+import tyro
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
+from typing import Optional
 from botocore.config import Config
 
 sys.path.append(str(Path(__file__).parent.parent))
 import config
+from d1_client import MAX_BOUND_PARAMS, D1Client
+
+
+SYNC_STATE_FILE = Path("pipeline/sync_state.json")
+
+
+def load_sync_state() -> dict:
+    """Return the last sync checkpoint, or {} if there is none."""
+    if not SYNC_STATE_FILE.exists():
+        return {}
+    
+    return orjson.loads(SYNC_STATE_FILE.read_bytes())
+
+
+def save_sync_state(state: dict):
+    """Persist the sync checkpoint."""
+    SYNC_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    SYNC_STATE_FILE.write_bytes(orjson.dumps(state, option=orjson.OPT_INDENT_2))
+
+
+def get_d1() -> D1Client:
+    return D1Client({
+        'account_id': config.CLOUDFLARE_ACCOUNT_ID,
+        'database_id': config.D1_DATABASE_ID,
+        'api_token': config.D1_API_TOKEN
+    })
 
 
 def parse_figure_key(key: str):
     """Parse 'figures/2510.14230/teaser.webp' -> (paper_id, kind, is_thumb)"""
-    if not key.startswith('figures/') or key.count('/') != 2:
+    # Reject non-figure keys before splitting; the caller feeds every object in the bucket
+    if not key.startswith('figures/') or not key.endswith('.webp'):
         return None
-    _, paper_id, filename = key.split('/')
+    parts = key.split('/')
+    if len(parts) != 3:
+        return None
+    filename = parts[2]
     if filename.endswith('_thumb.webp'):
-        return (paper_id, filename[:-11], True)  # Remove '_thumb.webp'
-    elif filename.endswith('.webp'):
-        return (paper_id, filename[:-5], False)  # Remove '.webp'
-    return None
+        return (parts[1], filename[:-11], True)  # Remove '_thumb.webp'
+    return (parts[1], filename[:-5], False)  # Remove '.webp'
+
 
+def _list_keys(s3, bucket: str, prefix: str) -> list:
+    """List every (key, LastModified) under a prefix (serial pagination)"""
+    paginator = s3.get_paginator('list_objects_v2')
+    return [(obj['Key'], obj['LastModified']) for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+            for obj in page.get('Contents', [])]
 
-def scan_r2(bucket: str) -> dict:
-    """Scan R2 and return {(paper_id, kind): {'r2_key': ..., 'thumb_key': ...}}"""
+
+def scan_r2(bucket: str, max_workers: int = 8) -> dict:
+    """Scan R2 and return {(paper_id, kind): {'r2_key': ..., 'thumb_key': ..., 'modified': datetime}}
+    
+    One delimiter listing splits figures/ into per-month prefixes ('figures/2510.' for
+    new-style IDs), which are then listed concurrently instead of paging the whole
+    bucket one request at a time.
+    """
     print("Scanning R2...", file=sys.stderr)
     
     s3 = boto3.client('s3',
@@ -38,158 +85,193 @@ def scan_r2(bucket: str) -> dict:
         region_name='auto'
     )
     
-    figures = {}
+    prefixes = []
+    keys = []
     paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix='figures/', Delimiter='.'):
+        prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+        keys.extend((obj['Key'], obj['LastModified']) for obj in page.get('Contents', []))
+    
+    figures = {}
+    
+    def add(key: str, modified: datetime):
+        parsed = parse_figure_key(key)
+        if not parsed:
+            return
+        
+        paper_id, kind, is_thumb = parsed
+        figure = figures.setdefault((paper_id, kind), {'r2_key': None, 'thumb_key': None, 'modified': modified})
+        figure['thumb_key' if is_thumb else 'r2_key'] = key
+        figure['modified'] = max(figure['modified'], modified)
     
-    for page in paginator.paginate(Bucket=bucket, Prefix='figures/'):
-        for obj in page.get('Contents', []):
-            parsed = parse_figure_key(obj['Key'])
-            if not parsed:
-                continue
-            
-            paper_id, kind, is_thumb = parsed
-            key = (paper_id, kind)
-            
-            if key not in figures:
-                figures[key] = {'r2_key': None, 'thumb_key': None}
-            
-            figures[key]['thumb_key' if is_thumb else 'r2_key'] = obj['Key']
+    for key, modified in keys:
+        add(key, modified)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_list_keys, s3, bucket, prefix) for prefix in prefixes]
+        for future in as_completed(futures):
+            for key, modified in future.result():
+                add(key, modified)
     
     print(f"  Found {len(figures):,} figure pairs", file=sys.stderr)
     return figures
 
 
-def get_existing_figures_d1() -> dict:
-    """Query D1 once for all existing figures, return {id: {'r2_key': str, 'thumb_key': str}}"""
+def get_existing_figures_d1(d1: D1Client, page_size: int = 10_000) -> dict:
+    """Read all existing figures from D1 in id-ordered pages, return {id: (r2_key, thumb_key)}"""
     print("Querying D1...", file=sys.stderr)
     
-    result = subprocess.run(
-        ['wrangler', 'd1', 'execute', 'alphascent-db', '--remote', '--json',
-         '--command', 'SELECT id, paper_id, kind, r2_key, thumb_key FROM figures'],
-        capture_output=True, text=True
-    )
-    
-    if result.returncode != 0:
-        print("  Warning: Could not query D1, assuming empty", file=sys.stderr)
-        return {}
-    
+    existing = {}
+    last_id = ''
     try:
-        data = json.loads(result.stdout)
-        existing = {}
-        for row in data[0].get('results', []):
-            figure_id = row['id']
-            existing[figure_id] = {
-                'paper_id': row['paper_id'],
-                'kind': row['kind'],
-                'r2_key': row.get('r2_key'),
-                'thumb_key': row.get('thumb_key')
-            }
-        print(f"  Found {len(existing):,} existing figures", file=sys.stderr)
-        return existing
+        while True:
+            rows = d1.query(
+                "SELECT id, r2_key, thumb_key FROM figures WHERE id > ? ORDER BY id LIMIT ?",
+                [last_id, page_size]
+            )
+            existing.update((row['id'], (row.get('r2_key'), row.get('thumb_key'))) for row in rows)
+            if len(rows) < page_size:
+                break
+            last_id = rows[-1]['id']
     except Exception as e:
-        print(f"  Error parsing D1 results: {e}", file=sys.stderr)
+        print(f"  Warning: Could not query D1, assuming empty: {e}", file=sys.stderr)
         return {}
+    
+    print(f"  Found {len(existing):,} existing figures", file=sys.stderr)
+    return existing
+
+
+def get_figures_d1_by_id(d1: D1Client, figure_ids: list) -> dict:
+    """Query D1 for the given figure IDs only, return {id: (r2_key, thumb_key)}"""
+    print(f"Querying D1 for {len(figure_ids):,} figures...", file=sys.stderr)
+    statements = []
+    for i in range(0, len(figure_ids), MAX_BOUND_PARAMS):
+        chunk = figure_ids[i:i + MAX_BOUND_PARAMS]
+        statements.append((f"SELECT id, r2_key, thumb_key FROM figures WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+    existing = {row['id']: (row.get('r2_key'), row.get('thumb_key')) for results in d1.query_batch(statements) for row in results}
+    print(f"  Found {len(existing):,} existing figures", file=sys.stderr)
+    return existing
+
+
+SYNC_UPSERT_COLUMNS = 5
+# As many rows per statement as D1's bound-parameter cap allows
+SYNC_ROWS_PER_STATEMENT = MAX_BOUND_PARAMS // SYNC_UPSERT_COLUMNS
+
+
+def sync_upsert_sql(row_count: int) -> str:
+    """Multi-row figures upsert with row_count placeholder tuples"""
+    values = ', '.join(['(?, ?, ?, ?, ?, 0, 0)'] * row_count)
+    return (
+        f"INSERT INTO figures (id, paper_id, kind, r2_key, thumb_key, width, height) VALUES {values} "
+        "ON CONFLICT(id) DO UPDATE SET r2_key = excluded.r2_key, thumb_key = COALESCE(excluded.thumb_key, figures.thumb_key)"
+    )
 
 
-def batch_insert_d1(inserts: list, updates: list, batch_size: int = 100):
-    """Batch insert/update figures into D1 using wrangler for minimal writes"""
+def batch_insert_d1(d1: D1Client, inserts: list, updates: list, batch_size: int = 500) -> int:
+    """Batch insert/update figures into D1 over the HTTP API with multi-row prepared statements
+    
+    Returns:
+        Number of failed batches
+    """
     total_ops = len(inserts) + len(updates)
     if total_ops == 0:
-        return
+        return 0
     
     print(f"Processing {len(inserts):,} inserts and {len(updates):,} updates in batches...", file=sys.stderr)
     
+    failed_batches = 0
     all_ops = inserts + updates
     for i in range(0, len(all_ops), batch_size):
         batch = all_ops[i:i + batch_size]
+        statements = []
+        for j in range(0, len(batch), SYNC_ROWS_PER_STATEMENT):
+            rows = batch[j:j + SYNC_ROWS_PER_STATEMENT]
+            params = [value for paper_id, kind, r2_key, thumb_key in rows
+                      for value in (f"{paper_id}-{kind}", paper_id, kind, r2_key, thumb_key)]
+            statements.append((sync_upsert_sql(len(rows)), params))
         
-        # Build multi-row INSERT/UPDATE
-        sql_lines = []
-        for paper_id, kind, r2_key, thumb_key in batch:
-            figure_id = f"{paper_id}-{kind}"
-            thumb_val = f"'{thumb_key.replace("'", "''")}'" if thumb_key else 'NULL'
-            r2_key_escaped = r2_key.replace("'", "''")
-            sql_lines.append(
-                f"INSERT INTO figures (id, paper_id, kind, r2_key, thumb_key, width, height) "
-                f"VALUES ('{figure_id}', '{paper_id}', '{kind}', '{r2_key_escaped}', {thumb_val}, 0, 0) "
-                f"ON CONFLICT(id) DO UPDATE SET "
-                f"r2_key = excluded.r2_key, "
-                f"thumb_key = COALESCE(excluded.thumb_key, figures.thumb_key)"
-            )
-        
-        sql = ';\n'.join(sql_lines) + ';'
-        
-        # Write to temp file and execute
-        temp_file = Path('/tmp/d1_batch_insert.sql')
-        temp_file.write_text(sql)
-        
-        result = subprocess.run(
-            ['wrangler', 'd1', 'execute', 'alphascent-db', '--remote', 
-             '--file', str(temp_file)],
-            capture_output=True, text=True
-        )
-        
-        if result.returncode != 0:
-            print(f"  ✗ Batch {i//batch_size + 1} failed: {result.stderr}", file=sys.stderr)
-        else:
+        try:
+            d1.execute_batch(statements)
             print(f"  ✓ Batch {i//batch_size + 1}/{(total_ops-1)//batch_size + 1}", file=sys.stderr)
-        
-        temp_file.unlink(missing_ok=True)
+        except Exception as e:
+            failed_batches += 1
+            print(f"  ✗ Batch {i//batch_size + 1} failed: {e}", file=sys.stderr)
+    
+    return failed_batches
 
 
-def main():
+def main(full: bool = False):
+    """
+    Sync R2 figures into the D1 figures table.
+    
+    Args:
+        full: Ignore the checkpoint and diff every R2 figure against D1
+    """
     print("\nR2 → D1 Figures Sync", file=sys.stderr)
     print("=" * 60, file=sys.stderr)
     
+    state = {} if full else load_sync_state()
+    since: Optional[datetime] = datetime.fromisoformat(state['last_modified']) if state.get('last_modified') else None
+    
     # 1. Scan R2 (one paginated read)
     figures = scan_r2(config.R2_BUCKET_NAME)
     
-    # 2. Query D1 (one read)
-    existing = get_existing_figures_d1()
+    # 2. Query D1: everything on a full sync, only figures touched since the checkpoint otherwise
+    d1 = get_d1()
+    if since is None:
+        candidates = figures
+        existing = get_existing_figures_d1(d1)
+    else:
+        # >= rather than > so objects written in the checkpoint's own second are re-checked
+        candidates = {key: data for key, data in figures.items() if data['modified'] >= since}
+        print(f"  {len(candidates):,} figure pairs modified since {since.isoformat()}", file=sys.stderr)
+        candidate_ids = [f"{paper_id}-{kind}" for (paper_id, kind), data in candidates.items() if data['r2_key']]
+        existing = get_figures_d1_by_id(d1, candidate_ids) if candidate_ids else {}
     
-    # 3. Build insert/update lists
-    to_insert = []
-    to_update = []
+    # 3. Build insert/update lists with set operations on figure IDs.
+    # Figures no wider than the thumbnail size are uploaded without a _thumb object
+    # and use the full image as their thumbnail (see process_and_upload_figure)
+    r2_figures = {
+        f"{paper_id}-{kind}": (paper_id, kind, data['r2_key'], data['thumb_key'] or data['r2_key'])
+        for (paper_id, kind), data in candidates.items() if data['r2_key']
+    }
     
-    for (paper_id, kind), data in figures.items():
-        if not data['r2_key']:
-            continue
-        
-        figure_id = f"{paper_id}-{kind}"
-        
-        if figure_id not in existing:
-            # New figure - insert
-            to_insert.append((paper_id, kind, data['r2_key'], data['thumb_key']))
-        else:
-            # Check if update needed
-            existing_data = existing[figure_id]
-            needs_update = False
-            
-            # Update if r2_key doesn't match
-            if existing_data['r2_key'] != data['r2_key']:
-                needs_update = True
-            
-            # Update if missing thumbnail and we have one
-            if not existing_data['thumb_key'] and data['thumb_key']:
-                needs_update = True
-            
-            if needs_update:
-                to_update.append((paper_id, kind, data['r2_key'], data['thumb_key']))
+    # New figures - insert
+    to_insert = [r2_figures[figure_id] for figure_id in r2_figures.keys() - existing.keys()]
+    
+    # Existing figures - update if r2_key or thumb_key doesn't match R2
+    to_update = []
+    for figure_id in r2_figures.keys() & existing.keys():
+        row = r2_figures[figure_id]
+        r2_key, thumb_key = existing[figure_id]
+        if r2_key != row[2] or thumb_key != row[3]:
+            to_update.append(row)
     
+    failed_batches = 0
     if not to_insert and not to_update:
         print("\n✓ All R2 figures already in D1 with correct keys and thumbnails!", file=sys.stderr)
-        return
+    else:
+        if to_insert:
+            print(f"\n{len(to_insert):,} new figures to insert", file=sys.stderr)
+        if to_update:
+            print(f"{len(to_update):,} existing figures to update (fixing r2_key/thumb_key)", file=sys.stderr)
+        
+        # 4. Batch insert/update (minimal writes)
+        failed_batches = batch_insert_d1(d1, to_insert, to_update)
     
-    if to_insert:
-        print(f"\n{len(to_insert):,} new figures to insert", file=sys.stderr)
-    if to_update:
-        print(f"{len(to_update):,} existing figures to update (fixing r2_key/thumb_key)", file=sys.stderr)
+    # 5. Advance the checkpoint only when every write landed, so failures are retried next run
+    if failed_batches:
+        print(f"\n✗ {failed_batches} batches failed; checkpoint not advanced", file=sys.stderr)
+        return
     
-    # 4. Batch insert/update (minimal writes)
-    batch_insert_d1(to_insert, to_update)
+    if figures:
+        save_sync_state({
+            'last_modified': max(data['modified'] for data in figures.values()).isoformat(),
+            'last_key_count': len(figures)
+        })
     
     print(f"\n✓ Sync complete!", file=sys.stderr)
 
 
 if __name__ == "__main__":
-    main()
+    tyro.cli(main)
@@ -44,33 +44,16 @@ def generate_access_token(
         'api_token': config.D1_API_TOKEN
     })
 
-    def esc(value: Optional[str]) -> str:
-        if not value:
-            return 'NULL'
-        return f"'{value.replace("'", "''")}'"
-
-    user_name_sql = esc(user_name)
-    user_email_sql = esc(user_email)
-    notes_sql = esc(notes)
-    expires_at_sql = f"'{expires_at.replace("'", "''")}'"
-
-    sql = f"""
+    sql = """
     INSERT INTO access_keys (
         id, key_hash, user_name, user_email,
         accessible_dates, expires_at, notes
-    ) VALUES (
-        '{key_id}',
-        '{key_hash}',
-        {user_name_sql},
-        {user_email_sql},
-        '{accessible_dates}',
-        {expires_at_sql},
-        {notes_sql}
-    )
+    ) VALUES (?, ?, ?, ?, ?, ?, ?)
     """
+    params = [key_id, key_hash, user_name or None, user_email or None, accessible_dates, expires_at, notes or None]
 
     try:
-        client.query(sql)
+        client.query(sql, params)
         print("\n" + "=" * 70)
         print("✓ Access Token Created Successfully")
         print("=" * 70)
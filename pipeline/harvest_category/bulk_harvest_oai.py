@@ -42,7 +42,7 @@ def main(
         end_date = datetime.now().strftime('%Y-%m-%d')
     
     print(f"\nHarvesting from OAI-PMH...", file=sys.stderr)
-    papers = harvest_category(
+    harvested = harvest_category(
         category=category,
         from_date=start_date,
         until_date=end_date,
@@ -51,7 +51,7 @@ def main(
         checkpoint_interval=100_000
     )
     
-    if not papers:
+    if not harvested:
         print(f"\n✓ No papers harvested", file=sys.stderr)
         db.close()
         return
@@ -60,7 +60,7 @@ def main(
     print(f"\n{'='*60}", file=sys.stderr)
     print(f"Summary", file=sys.stderr)
     print(f"{'='*60}", file=sys.stderr)
-    print(f"Harvested:   {len(papers)} papers", file=sys.stderr)
+    print(f"Harvested:   {harvested} papers", file=sys.stderr)
     print(f"Total in DB: {stats['papers']} papers", file=sys.stderr)
     
     db.close()
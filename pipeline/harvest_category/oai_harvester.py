@@ -1,12 +1,15 @@
 """OAI-PMH harvester for bulk metadata from arXiv."""
 
+import io
 import re
 import sys
 from datetime import datetime
 import xml.etree.ElementTree as ET
-from typing import Dict, List, Optional, Tuple
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from database import PipelineDB
 
@@ -14,22 +17,57 @@ from database import PipelineDB
 OAI_PMH_URL = "https://oaipmh.arxiv.org/oai"
 OAI_NS = "{http://www.openarchives.org/OAI/2.0/}"
 ARXIV_NS = "{http://arxiv.org/OAI/arXiv/}"
+LIST_RECORDS_TAG = f"{OAI_NS}ListRecords"
+RECORD_TAG = f"{OAI_NS}record"
+RESUMPTION_TOKEN_TAG = f"{OAI_NS}resumptionToken"
 
+_URL_RE = re.compile(r'https?://[^\s<>"{}|\\^`\[\]]+')
+_CODE_RE = re.compile(r'\bcode\b', re.IGNORECASE)
+_PROJECT_PAGE_RE = re.compile(r'\bproject\s+page\b', re.IGNORECASE)
+# Either keyword; most comments have neither, so one scan rejects them
+_LINK_KEYWORD_RE = re.compile(r'\bcode\b|\bproject\s+page\b', re.IGNORECASE)
 
-def harvest_category(category: str, from_date: Optional[str] = None, 
-                     until_date: Optional[str] = None, limit: Optional[int] = None, 
-                     db: Optional[PipelineDB] = None, checkpoint_interval: int = 500_000) -> List[Dict]:
+
+def _create_session() -> requests.Session:
+    """Keep-alive session for the resumption-token loop.
+    
+    OAI-PMH flow control answers 503 with Retry-After, which urllib3's Retry honors.
     """
-    Harvest papers from OAI-PMH by category with optional date range.
+    session = requests.Session()
+    retries = Retry(total=5, backoff_factor=2, status_forcelist=[500, 502, 503, 504], raise_on_status=False)
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4, max_retries=retries))
+    session.headers["User-Agent"] = "alphascent-harvester (OAI-PMH)"
+    return session
+
+
+_SESSION = _create_session()
+
+
+def harvest_category(category: str, db: PipelineDB, from_date: Optional[str] = None,
+                     until_date: Optional[str] = None, limit: Optional[int] = None,
+                     checkpoint_interval: int = 500_000) -> int:
+    """
+    Harvest papers from OAI-PMH by category with optional date range into a database.
+    
+    Records are streamed into the database in checkpoint_interval batches, so at
+    most one batch is held in memory however large the harvest.
     
     Args:
         category: Category set (e.g., 'cs', 'physics:hep-th')
+        db: Database instance for incremental saves
         from_date: Optional start date (YYYY-MM-DD)
         until_date: Optional end date (YYYY-MM-DD). Defaults to today if from_date is provided.
         limit: Optional limit on number of papers
-        db: Optional database instance for incremental saves
         checkpoint_interval: Save to database every N papers
+        
+    Returns:
+        Number of papers harvested
     """
+    params, description = _category_params(category, from_date, until_date)
+    return _harvest_common(params, limit, db, checkpoint_interval, description)
+
+
+def _category_params(category: str, from_date: Optional[str], until_date: Optional[str]) -> Tuple[Dict, str]:
     if from_date and not until_date:
         until_date = datetime.now().strftime('%Y-%m-%d')
     
@@ -45,21 +83,54 @@ def harvest_category(category: str, from_date: Optional[str] = None,
         params['until'] = until_date
     
     date_desc = f" ({from_date} to {until_date or from_date})" if from_date else ""
-    return _harvest_common(params, limit, db, checkpoint_interval, f"category '{category}'{date_desc}")
+    return params, f"category '{category}'{date_desc}"
 
 
-def _harvest_common(params: Dict, limit: Optional[int], db: Optional[PipelineDB],
-                    checkpoint_interval: int, description: str) -> List[Dict]:
-    papers = []
+def iter_records(params: Dict, limit: Optional[int] = None) -> Iterator[Dict]:
+    """Yield parsed records page by page, following resumption tokens. Request errors propagate."""
     resumption_token = None
-    saved_count = 0
+    harvested = 0
     initial_params = params.copy()
+    # One date for the whole run, however long it takes
+    scraped_date = datetime.now().strftime('%Y-%m-%d')
+    
+    while True:
+        params = {'verb': 'ListRecords', 'resumptionToken': resumption_token} if resumption_token else initial_params.copy()
+        
+        with _SESSION.get(OAI_PMH_URL, params=params, timeout=60, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            records, resumption_token = parse_oai_response(
+                response.raw, scraped_date, max_records=limit - harvested if limit else None
+            )
+        
+        harvested += len(records)
+        yield from records
+        
+        print(f"  Harvested {harvested} papers so far...", file=sys.stderr)
+        
+        if (limit and harvested >= limit) or not resumption_token:
+            return
+
+
+def _harvest_common(params: Dict, limit: Optional[int], db: PipelineDB,
+                    checkpoint_interval: int, description: str) -> int:
+    buffer = []
+    harvested = 0
+    saved_count = 0
     
     print(f"Harvesting {description} from OAI-PMH...", file=sys.stderr)
-    if db:
-        print(f"  Checkpointing enabled: saving every {checkpoint_interval} papers", file=sys.stderr)
+    print(f"  Checkpointing enabled: saving every {checkpoint_interval} papers", file=sys.stderr)
     
     def save_batch(papers_to_save: List[Dict]) -> int:
+        # One transaction for the whole batch, so a failure rolls back cleanly before
+        # the row-by-row retry that isolates bad records
+        try:
+            with db.transaction():
+                return db.insert_papers_many(papers_to_save)
+        except Exception as e:
+            print(f"  Warning: Batch save of {len(papers_to_save)} papers failed ({e}); retrying row by row", file=sys.stderr)
+        
         count = 0
         for paper in papers_to_save:
             try:
@@ -69,87 +140,90 @@ def _harvest_common(params: Dict, limit: Optional[int], db: Optional[PipelineDB]
                 print(f"  Warning: Failed to save {paper.get('id', 'unknown')}: {e}", file=sys.stderr)
         return count
     
-    while True:
-        params = {'verb': 'ListRecords', 'resumptionToken': resumption_token} if resumption_token else initial_params.copy()
-        
-        try:
-            response = requests.get(OAI_PMH_URL, params=params, timeout=60)
-            response.raise_for_status()
+    try:
+        for paper in iter_records(params, limit):
+            buffer.append(paper)
+            harvested += 1
             
-            records, resumption_token = parse_oai_response(response.content)
-            papers.extend(records)
-            
-            if db and len(papers) - saved_count >= checkpoint_interval:
-                saved_count += save_batch(papers[saved_count:])
+            if len(buffer) >= checkpoint_interval:
+                saved_count += save_batch(buffer)
+                buffer.clear()
                 print(f"  Checkpoint: Saved {saved_count} papers to database", file=sys.stderr)
-            
-            print(f"  Harvested {len(papers)} papers so far...", file=sys.stderr)
-            
-            if limit and len(papers) >= limit:
-                papers = papers[:limit]
-                break
-            
-            if not resumption_token:
-                break
-                
-        except Exception as e:
-            print(f"  Error: {e}", file=sys.stderr)
-            if db and saved_count < len(papers):
-                print(f"  Saving progress before exit...", file=sys.stderr)
-                saved_count += save_batch(papers[saved_count:])
-                print(f"  Saved {saved_count} papers before exit", file=sys.stderr)
-            break
+    except Exception as e:
+        print(f"  Error: {e}", file=sys.stderr)
+        if buffer:
+            print(f"  Saving progress before exit...", file=sys.stderr)
+            saved_count += save_batch(buffer)
+            buffer.clear()
+            print(f"  Saved {saved_count} papers before exit", file=sys.stderr)
     
-    if db and saved_count < len(papers):
-        print(f"  Final save: {len(papers) - saved_count} remaining papers...", file=sys.stderr)
-        saved_count += save_batch(papers[saved_count:])
+    if buffer:
+        print(f"  Final save: {len(buffer)} remaining papers...", file=sys.stderr)
+        saved_count += save_batch(buffer)
     
-    print(f"  Total harvested: {len(papers)} papers", file=sys.stderr)
-    if db:
-        print(f"  Total saved to database: {saved_count} papers", file=sys.stderr)
+    print(f"  Total harvested: {harvested} papers", file=sys.stderr)
+    print(f"  Total saved to database: {saved_count} papers", file=sys.stderr)
     
-    return papers
+    return harvested
 
 
-def parse_oai_response(xml_content: bytes) -> Tuple[List[Dict], Optional[str]]:
-    """Parse OAI-PMH response and extract papers and resumption token."""
-    root = ET.fromstring(xml_content)
+def parse_oai_response(source: Union[bytes, BinaryIO], scraped_date: Optional[str] = None,
+                       max_records: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+    """Parse OAI-PMH response and extract papers and resumption token.
+    
+    Streams with iterparse (bytes or a file-like such as response.raw): each record
+    is parsed as soon as it closes and then dropped from the tree, so the full
+    page DOM is never held in memory. With max_records, parsing stops as soon as
+    that many papers are read; the resumption token is then not returned.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    scraped_date = scraped_date or datetime.now().strftime('%Y-%m-%d')
     
     records = []
-    list_records = root.find(f"{OAI_NS}ListRecords")
+    resumption_token = None
+    list_records = None
     
-    if list_records is not None:
-        for record in list_records.findall(f"{OAI_NS}record"):
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if elem.tag == LIST_RECORDS_TAG:
+                list_records = elem
+            continue
+        
+        if elem.tag == RECORD_TAG:
             try:
-                paper = parse_oai_record(record)
+                paper = parse_oai_record(elem, scraped_date)
                 if paper:
                     records.append(paper)
             except Exception as e:
                 print(f"  Warning: Failed to parse record: {e}", file=sys.stderr)
-    
-    resumption_token_elem = list_records.find(f"{OAI_NS}resumptionToken") if list_records else None
-    resumption_token = resumption_token_elem.text if resumption_token_elem is not None and resumption_token_elem.text else None
+            if list_records is not None:
+                list_records.remove(elem)
+            if max_records is not None and len(records) >= max_records:
+                return records, None
+        elif elem.tag == RESUMPTION_TOKEN_TAG and elem.text:
+            resumption_token = elem.text
     
     return records, resumption_token
 
 
 def extract_links_from_comments(comments: str) -> Tuple[Optional[str], Optional[str]]:
-    if not comments:
+    if not comments or not _LINK_KEYWORD_RE.search(comments):
         return None, None
     
-    def find_url_after(pattern: str) -> Optional[str]:
-        match = re.search(pattern, comments, re.IGNORECASE)
+    def find_url_after(pattern: re.Pattern) -> Optional[str]:
+        match = pattern.search(comments)
         if match:
-            url_match = re.search(r'https?://[^\s<>"{}|\\^`\[\]]+', comments[match.end():])
+            url_match = _URL_RE.search(comments, match.end())
             if url_match:
                 return url_match.group(0).strip()
         return None
     
-    return find_url_after(r'\bcode\b'), find_url_after(r'\bproject\s+page\b')
+    return find_url_after(_CODE_RE), find_url_after(_PROJECT_PAGE_RE)
 
 
-def parse_oai_record(record: ET.Element) -> Optional[Dict]:
-    """Parse single OAI-PMH record to paper dict."""
+def parse_oai_record(record: ET.Element, scraped_date: Optional[str] = None) -> Optional[Dict]:
+    """Parse single OAI-PMH record to paper dict (scraped_date defaults to today)."""
     metadata = record.find(f"{OAI_NS}metadata/{ARXIV_NS}arXiv")
     
     if metadata is None:
@@ -159,8 +233,8 @@ def parse_oai_record(record: ET.Element) -> Optional[Dict]:
     if not arxiv_id:
         return None
     
-    title = metadata.findtext(f"{ARXIV_NS}title", "").strip().replace("\n", " ")
-    title = " ".join(title.split())
+    # split() with no argument strips and collapses all whitespace, newlines included
+    title = " ".join(metadata.findtext(f"{ARXIV_NS}title", "").split())
     
     authors = []
     authors_elem = metadata.find(f"{ARXIV_NS}authors")
@@ -172,13 +246,10 @@ def parse_oai_record(record: ET.Element) -> Optional[Dict]:
                 full_name = f"{forenames} {keyname}".strip() if forenames else keyname
                 authors.append(full_name)
     
-    abstract = metadata.findtext(f"{ARXIV_NS}abstract", "")
-    if abstract:
-        abstract = abstract.strip().replace("\n", " ")
-        abstract = " ".join(abstract.split())
+    abstract = " ".join(metadata.findtext(f"{ARXIV_NS}abstract", "").split())
     
     categories_text = metadata.findtext(f"{ARXIV_NS}categories", "")
-    categories = [c.strip() for c in categories_text.split() if c.strip()]
+    categories = categories_text.split()
     primary_category = categories[0] if categories else None
     
     created = metadata.findtext(f"{ARXIV_NS}created", "")
@@ -198,7 +269,7 @@ def parse_oai_record(record: ET.Element) -> Optional[Dict]:
         'abstract': abstract,
         'submitted_date': created,
         'announce_date': None,
-        'scraped_date': datetime.now().strftime('%Y-%m-%d'),
+        'scraped_date': scraped_date or datetime.now().strftime('%Y-%m-%d'),
         'pdf_url': f'https://arxiv.org/pdf/{arxiv_id}',
         'code_url': code_url,
         'project_url': project_url,